@@ -0,0 +1,106 @@
+"""Cold-start benchmark: how long a fresh worker takes to import, start and become ready.
+
+Each run is a new interpreter (so nothing is already imported or cached)
+that imports main, enters the app lifespan against benchmarks.fake_docker
+and SQLite, then polls /ready until it returns 200 and sends a first
+/login. Reported per run: import time, lifespan startup time, time from
+lifespan start to ready (and to each dependency check passing) and the
+first login's latency. The median import + ready time is checked against
+--budget, exiting non-zero when over it so the number can gate CI. Run
+from backend/:
+
+    python -m benchmarks.cold_start --runs 5 --budget 3.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ["import", "startup", "ready", "first_login"]
+
+def child(args):
+    began = time.perf_counter()
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ENCRYPTION_KEY", "ZGVmYXVsdC1iZW5jaG1hcmstZW5jcnlwdGlvbi1rZXk=")
+    os.environ.setdefault("STATE_BACKEND", "memory")
+    import main
+    imported = time.perf_counter()
+
+    import asyncio
+    import tempfile
+    import httpx
+    from benchmarks import fake_docker
+    from benchmarks.harness import use_sqlite
+    from benchmarks.load import seed_users
+    from services import whitelist
+
+    fake_docker.install(latency=args.docker_latency / 1000)
+    session_factory = use_sqlite(main.app, os.path.join(tempfile.mkdtemp(), "cold.db"))
+    whitelist.SessionLocal = session_factory
+    seed_users(session_factory, 1)
+
+    async def run():
+        timings = {"import": imported - began}
+        lifespan_began = time.perf_counter()  # Readiness phases exclude the benchmark's own setup
+        async with main.app.router.lifespan_context(main.app):
+            timings["startup"] = time.perf_counter() - lifespan_began
+            # The whitelist cache loads over a Postgres LISTEN connection; load it from SQLite instead
+            asyncio.get_running_loop().run_in_executor(None, whitelist.get_whitelist_cache().load)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                checks = {}
+                while True:
+                    response = await client.get("/ready")
+                    for name, state in response.json()["checks"].items():
+                        if state == "ok":
+                            checks.setdefault(name, time.perf_counter() - lifespan_began)
+                    if response.status_code == 200:
+                        break
+                    await asyncio.sleep(0.005)
+                timings["ready"] = time.perf_counter() - lifespan_began
+                login_start = time.perf_counter()
+                await client.post("/login", json={"email": "player0@bench.local", "password": "pw"})
+                timings["first_login"] = time.perf_counter() - login_start
+        timings["checks"] = checks
+        print(json.dumps(timings), flush=True)
+
+    asyncio.run(run())
+    os._exit(0)  # Fake event streams block their daemon threads forever
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds; median import + time-to-ready must stay under it")
+    parser.add_argument("--docker-latency", type=float, default=20, help="ms per fake Docker API call")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-m", "benchmarks.cold_start", "--child",
+             "--docker-latency", str(args.docker_latency)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'phase':<24} {'p50 s':>8} {'max s':>8}")
+    for phase in PHASES:
+        samples = [result[phase] for result in results]
+        print(f"{phase:<24} {statistics.median(samples):>8.3f} {max(samples):>8.3f}")
+    for check in sorted(results[0]["checks"]):
+        samples = [result["checks"][check] for result in results]
+        print(f"  {check + ' ok':<22} {statistics.median(samples):>8.3f} {max(samples):>8.3f}")
+    ready = statistics.median(result["import"] + result["ready"] for result in results)
+    verdict = "within" if ready <= args.budget else "OVER"
+    print(f"time to ready {ready:.3f}s, {verdict} the {args.budget:.1f}s budget")
+    sys.exit(0 if ready <= args.budget else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""In-process stand-in for the Docker API used by the benchmarks.
+
+Implements the subset of docker.DockerClient that DockerManager uses, with
+a configurable per-call latency, a container lifecycle that emits events,
+and follow-mode stats and log streams. Install it with install(), which
+makes DockerManager connect to it instead of a real daemon.
+"""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import itertools
+import queue
+import random
+import threading
+import time
+
+from docker.errors import APIError, NotFound
+
+def docker_time(moment: float = None) -> str:
+    return datetime.fromtimestamp(moment or time.time(), tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+class FakeContainer:
+    def __init__(self, daemon, record: dict):
+        self._daemon = daemon
+        self.id = record["Id"]
+        self.name = record["Name"]
+        self.attrs = record
+
+    @property
+    def status(self):
+        return self.attrs["State"]["Status"]
+
+    def stop(self, timeout: int = 10):
+        self._daemon.api.stop(self.id, timeout=timeout)
+
+    def remove(self, force: bool = False):
+        self._daemon.api.remove_container(self.id, force=force)
+
+    def logs(self, tail: int = 10, **kwargs):
+        return b"".join(self._daemon.api.logs(self.id, tail=tail))
+
+    def stats(self, stream: bool = False, **kwargs):
+        return next(self._daemon.api.stats(self.id, decode=True))
+
+class FakeContainers:
+    def __init__(self, daemon):
+        self._daemon = daemon
+
+    def run(self, image: str, name: str = None, **kwargs):
+        daemon = self._daemon
+        daemon.delay()
+        with daemon.lock:
+            if name in daemon.by_name:
+                raise APIError(f'409 Conflict: the container name "/{name}" is already in use')
+            container_id = f"{next(daemon.ids):064x}"
+            record = {
+                "Id": container_id,
+                "Name": name,
+                "Config": {"Labels": kwargs.get("labels") or {}, "Image": image},
+                "State": {
+                    "Status": "running", "StartedAt": docker_time(),
+                    "ExitCode": 0, "OOMKilled": False
+                }
+            }
+            daemon.records[container_id] = record
+            daemon.by_name[name] = container_id
+        daemon.emit("create", record)
+        daemon.emit("start", record)
+        return FakeContainer(daemon, record)
+
+    def get(self, name_or_id: str):
+        self._daemon.delay()
+        return FakeContainer(self._daemon, self._daemon.record(name_or_id))
+
+    def list(self, all: bool = False, filters: dict = None):
+        self._daemon.delay()
+        filters = filters or {}
+        containers = []
+        for record in list(self._daemon.records.values()):
+            if not all and record["State"]["Status"] != "running":
+                continue
+            if "name" in filters and filters["name"] not in record["Name"]:
+                continue
+            if "label" in filters:
+                key, _, value = filters["label"].partition("=")
+                if record["Config"]["Labels"].get(key) != (value or record["Config"]["Labels"].get(key)):
+                    continue
+            containers.append(FakeContainer(self._daemon, record))
+        return containers
+
+class FakeAPI:
+    def __init__(self, daemon):
+        self._daemon = daemon
+
+    def stop(self, name_or_id: str, timeout: int = 10):
+        daemon = self._daemon
+        record = daemon.record(name_or_id)
+        time.sleep(daemon.stop_latency)
+        if record["State"]["Status"] == "running":
+            record["State"]["Status"] = "exited"
+            record["State"]["ExitCode"] = 143
+            daemon.emit("die", record, exitCode="143")
+
+    def restart(self, name_or_id: str, timeout: int = 10):
+        record = self._daemon.record(name_or_id)
+        self.stop(name_or_id)
+        record["State"].update(Status="running", StartedAt=docker_time())
+        self._daemon.emit("start", record)
+
+    def remove_container(self, name_or_id: str, force: bool = False):
+        daemon = self._daemon
+        daemon.delay()
+        record = daemon.record(name_or_id)
+        if record["State"]["Status"] == "running":
+            if not force:
+                raise APIError("409 Conflict: stop the container before removing it")
+            record["State"]["Status"] = "exited"
+            daemon.emit("die", record, exitCode="137")
+        with daemon.lock:
+            daemon.records.pop(record["Id"], None)
+            daemon.by_name.pop(record["Name"], None)
+        daemon.emit("destroy", record)
+
+    def rename(self, name_or_id: str, name: str):
+        daemon = self._daemon
+        daemon.delay()
+        record = daemon.record(name_or_id)
+        with daemon.lock:
+            daemon.by_name.pop(record["Name"], None)
+            record["Name"] = name
+            daemon.by_name[name] = record["Id"]
+        daemon.emit("rename", record)
+
+    def put_archive(self, name_or_id: str, path: str, data: bytes):
+        self._daemon.delay()
+        return True
+
+    def inspect_container(self, name_or_id: str):
+        self._daemon.delay()
+        record = self._daemon.record(name_or_id)
+        return {**record, "State": {**record["State"], "Running": record["State"]["Status"] == "running"}}
+
+    def inspect_image(self, image: str):
+        self._daemon.delay()
+        return {"Config": {"Entrypoint": ["/start"], "Cmd": []}}
+
+    def events(self, decode: bool = True, filters: dict = None, **kwargs):
+        subscriber = queue.Queue()
+        self._daemon.subscribers.append(subscriber)
+        while True:
+            yield subscriber.get()
+
+    def stats(self, name_or_id: str, stream: bool = True, decode: bool = True):
+        daemon = self._daemon
+        record = daemon.record(name_or_id)
+        total = system = 0
+        previous = {"cpu_usage": {"total_usage": 0}, "system_cpu_usage": 0}
+        while record["State"]["Status"] == "running":
+            total += random.randint(50_000_000, 400_000_000)
+            system += 1_000_000_000 * 4
+            current = {"cpu_usage": {"total_usage": total}, "system_cpu_usage": system, "online_cpus": 4}
+            yield {
+                "read": docker_time(),
+                "cpu_stats": current,
+                "precpu_stats": previous,
+                "memory_stats": {"usage": random.randint(300, 700) << 20, "stats": {"inactive_file": 20 << 20}}
+            }
+            previous = current
+            time.sleep(daemon.stats_interval)
+
+    def logs(self, name_or_id: str, stream: bool = False, follow: bool = False,
+             timestamps: bool = False, tail=None, since=None):
+        daemon = self._daemon
+        record = daemon.record(name_or_id)
+        while True:
+            line = random.choice(daemon.log_lines)
+            yield f"{docker_time()} {line}\n".encode() if timestamps else f"{line}\n".encode()
+            if not follow or record["State"]["Status"] != "running":
+                return
+            time.sleep(daemon.log_interval)
+
+class FakeDockerClient:
+    """One simulated daemon; every DockerManager connection shares its state"""
+
+    def __init__(self, latency: float = 0.02, stop_latency: float = 0.2,
+                 stats_interval: float = 1.0, log_interval: float = 2.0):
+        self.latency = latency
+        self.stop_latency = stop_latency
+        self.stats_interval = stats_interval
+        self.log_interval = log_interval
+        self.log_lines = [
+            "[Client] Tick", "[Client] Still connected",
+            "You picked up 3x [Rare] Diamond", "You picked up Shiny [Epic] Emerald",
+            "<Steve> picked up 64 dirt lol"
+        ]
+        self.records = {}
+        self.by_name = {}
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.containers = FakeContainers(self)
+        self.api = FakeAPI(self)
+        self.networks = SimpleNamespace(
+            list=lambda names=None: [SimpleNamespace(name=name) for name in names or []],
+            create=lambda *args, **kwargs: None
+        )
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def record(self, name_or_id: str) -> dict:
+        container_id = self.by_name.get(name_or_id, name_or_id)
+        record = self.records.get(container_id)
+        if record is None:
+            raise NotFound(f"No such container: {name_or_id}")
+        return record
+
+    def emit(self, action: str, record: dict, **attributes):
+        event = {
+            "Type": "container",
+            "Action": action,
+            "Actor": {"ID": record["Id"], "Attributes": {"name": record["Name"], **attributes}},
+            "timeNano": time.time_ns()
+        }
+        for subscriber in list(self.subscribers):
+            subscriber.put(event)
+
+    def ping(self):
+        self.delay()
+        return True
+
+    def info(self):
+        return {"MemTotal": 64 << 30, "NCPU": 16}
+
+    def close(self):
+        pass
+
+def install(**options) -> FakeDockerClient:
+    """Make every DockerManager connect to a single FakeDockerClient"""
+    from services import docker_manager
+    client = FakeDockerClient(**options)
+    docker_manager.docker.from_env = lambda **kwargs: client
+    return client
@@ -0,0 +1,83 @@
+"""Shared pieces of the benchmarks: SQLite wiring, latency recording and loop lag."""
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, ThreadedSession, get_async_db
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def use_sqlite(app, path: str):
+    """Serve the app's async DB dependency from a SQLite file; returns its session factory"""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    async def get_benchmark_db():
+        db = ThreadedSession(session_factory())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    app.dependency_overrides[get_async_db] = get_benchmark_db
+    return session_factory
+
+class LatencyRecorder:
+    """Per-operation latency samples and status counts"""
+
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+
+    def record(self, name: str, seconds: float, status: int):
+        self.samples.setdefault(name, []).append(seconds)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def report(self, elapsed: float):
+        print(f"{'operation':<22} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+        for name, samples in sorted(self.samples.items()):
+            print(
+                f"{name:<22} {len(samples):>7} {len(samples) / elapsed:>8.1f} "
+                f"{statistics.median(samples) * 1000:>8.1f} {percentile(samples, 99) * 1000:>8.1f} "
+                f"{max(samples) * 1000:>8.1f}  {self.statuses[name]}"
+            )
+
+class LoopLagProbe:
+    """Measures how late the event loop wakes from a fixed sleep, i.e. how long it was blocked"""
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            due = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - due, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def report(self):
+        blocked = sum(lag for lag in self.lags if lag > self.threshold)
+        print(
+            f"event loop lag: p50 {statistics.median(self.lags) * 1000:.1f} ms, "
+            f"p99 {percentile(self.lags, 99) * 1000:.1f} ms, max {max(self.lags) * 1000:.1f} ms, "
+            f"blocked >{self.threshold * 1000:.0f} ms: {blocked:.2f}s total"
+        )
@@ -0,0 +1,173 @@
+"""Mixed-load benchmark against a fake Docker daemon and SQLite.
+
+Runs the app in-process with DockerManager connected to
+benchmarks.fake_docker (configurable per-call latency) and the API's
+database on SQLite, then drives one or more traffic shapes at once:
+
+    pollers  users polling /minecraft/status and /minecraft/stats like the dashboard
+    logins   bursts of /login
+    churn    users cycling /minecraft/start-afk and /minecraft/stop-afk
+    mix      all of the above
+
+and reports per-endpoint throughput and p50/p99 latency plus event loop
+lag. Run from backend/:
+
+    python -m benchmarks.load --scenario mix --users 200 --duration 30
+    python -m benchmarks.load --scenario churn --docker-latency 50 --churners 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ENCRYPTION_KEY", "ZGVmYXVsdC1iZW5jaG1hcmstZW5jcnlwdGlvbi1rZXk=")
+os.environ.setdefault("STATE_BACKEND", "memory")
+os.environ.setdefault("LIFECYCLE_RATE_PER_MINUTE", "0")  # Churners cycle far faster than a real user
+
+import httpx
+
+from benchmarks import fake_docker
+from benchmarks.harness import LatencyRecorder, LoopLagProbe, use_sqlite
+from core import security
+from main import app
+from models.user import User, Whitelist
+from services import whitelist
+from services.container_index import get_container_index
+from services.docker_manager import CLIENT_PREFIX
+from services.item_tracker import get_item_tracker
+from services.log_stream import get_log_hub
+from services.relay import get_relay
+from services.stats_collector import get_stats_collector
+
+SCENARIOS = {
+    "pollers": {"pollers"},
+    "logins": {"logins"},
+    "churn": {"churn"},
+    "mix": {"pollers", "logins", "churn"},
+}
+
+def seed_users(session_factory, count: int) -> list:
+    """Create whitelisted users Player0..N sharing one bcrypt hash of "pw"; returns their emails/IGNs"""
+    hashed = security.get_password_hash("pw")
+    users = [(f"player{n}@bench.local", f"Player{n}") for n in range(count)]
+    with session_factory() as db:
+        for email, ign in users:
+            db.add(User(email=email, ign=ign, hashed_password=hashed))
+            db.add(Whitelist(ign=ign, approved=True))
+        db.commit()
+    return users
+
+def start_background_services():
+    """The parts of the app lifespan the routes read from, minus Postgres-only writers"""
+    get_stats_collector()
+    get_log_hub().add_sink(get_item_tracker().handle_line)
+    get_relay().lead()
+    whitelist.get_whitelist_cache().load()
+
+async def timed(recorder: LatencyRecorder, name: str, request):
+    start = time.perf_counter()
+    response = await request
+    recorder.record(name, time.perf_counter() - start, response.status_code)
+    return response
+
+async def poller(client, recorder, headers, interval: float, stop_at: float):
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.perf_counter() < stop_at:
+        await timed(recorder, "GET /status", client.get("/minecraft/status", headers=headers))
+        await timed(recorder, "GET /stats", client.get("/minecraft/stats", headers=headers))
+        await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+
+async def login_bursts(client, recorder, users, size: int, interval: float, stop_at: float):
+    while time.perf_counter() < stop_at:
+        burst = random.sample(users, min(size, len(users)))
+        await asyncio.gather(*(
+            timed(recorder, "POST /login", client.post("/login", json={"email": email, "password": "pw"}))
+            for email, _ in burst
+        ))
+        await asyncio.sleep(interval)
+
+async def churner(client, recorder, headers, pause: float, stop_at: float):
+    await asyncio.sleep(random.uniform(0, pause))
+    while time.perf_counter() < stop_at:
+        await timed(recorder, "POST /start-afk", client.post("/minecraft/start-afk", headers=headers))
+        await asyncio.sleep(pause * random.uniform(0.5, 1.5))
+        await timed(recorder, "POST /stop-afk", client.post("/minecraft/stop-afk", headers=headers))
+        await asyncio.sleep(pause * random.uniform(0.5, 1.5))
+
+async def run(args):
+    daemon = fake_docker.install(
+        latency=args.docker_latency / 1000,
+        stop_latency=args.stop_latency / 1000,
+        stats_interval=args.stats_interval,
+        log_interval=args.log_interval
+    )
+    session_factory = use_sqlite(app, os.path.join(tempfile.mkdtemp(), "bench.db"))
+    whitelist.SessionLocal = session_factory
+    users = seed_users(session_factory, args.users + args.churners)
+    pollers, churners = users[:args.users], users[args.users:]
+    tokens = {email: security.create_access_token(data={"sub": email}) for email, _ in users}
+    scenario = SCENARIOS[args.scenario]
+
+    start_background_services()
+    if "pollers" in scenario:
+        # Dashboard users mostly have a session running
+        for _, ign in pollers[:int(len(pollers) * args.running)]:
+            daemon.containers.run("afk-minecraft", name=f"{CLIENT_PREFIX}{ign}")
+    while len(get_container_index().running()) < int(len(pollers) * args.running) * ("pollers" in scenario):
+        await asyncio.sleep(0.05)
+
+    recorder = LatencyRecorder()
+    probe = LoopLagProbe()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        probe.start()
+        began = time.perf_counter()
+        stop_at = began + args.duration
+        tasks = []
+        if "pollers" in scenario:
+            tasks += [
+                poller(client, recorder, {"Authorization": f"Bearer {tokens[email]}"}, args.poll_interval, stop_at)
+                for email, _ in pollers
+            ]
+        if "logins" in scenario:
+            tasks.append(login_bursts(client, recorder, users, args.burst_size, args.burst_interval, stop_at))
+        if "churn" in scenario:
+            tasks += [
+                churner(client, recorder, {"Authorization": f"Bearer {tokens[email]}"}, args.churn_pause, stop_at)
+                for email, _ in churners
+            ]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - began
+        await probe.stop()
+
+    print(
+        f"scenario {args.scenario}: {args.users} pollers, {args.churners} churners, "
+        f"docker latency {args.docker_latency:.0f} ms, {elapsed:.1f}s"
+    )
+    recorder.report(elapsed)
+    probe.report()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mix")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--users", type=int, default=100, help="dashboard pollers")
+    parser.add_argument("--running", type=float, default=0.8, help="share of pollers with a running client")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--burst-size", type=int, default=10)
+    parser.add_argument("--burst-interval", type=float, default=5.0)
+    parser.add_argument("--churners", type=int, default=10, help="users cycling start/stop")
+    parser.add_argument("--churn-pause", type=float, default=1.0)
+    parser.add_argument("--docker-latency", type=float, default=20, help="ms per fake Docker API call")
+    parser.add_argument("--stop-latency", type=float, default=200, help="ms for a fake container stop")
+    parser.add_argument("--stats-interval", type=float, default=1.0)
+    parser.add_argument("--log-interval", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    os._exit(0)  # Fake event/stats/log streams block their daemon threads forever
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Login throughput benchmark.
+
+Drives concurrent /login requests against the app in-process while a probe
+polls an unrelated endpoint, then reports login req/s and the probe's
+latency percentiles. Run from backend/:
+
+    python -m benchmarks.login_throughput --logins 200 --concurrency 16
+    python -m benchmarks.login_throughput --inline   # bcrypt on the event loop, for comparison
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ENCRYPTION_KEY", "ZGVmYXVsdC1iZW5jaG1hcmstZW5jcnlwdGlvbi1rZXk=")
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+import httpx
+
+from benchmarks.harness import percentile, use_sqlite
+from core import security
+from main import app
+from models.user import User
+
+async def run(args):
+    session_factory = use_sqlite(app, os.path.join(tempfile.mkdtemp(), "bench.db"))
+    with session_factory() as db:
+        db.add(User(email="bench@example.com", ign="Bench", hashed_password=security.get_password_hash("pw")))
+        db.commit()
+    if args.inline:
+        async def inline(func, *func_args):
+            return func(*func_args)
+        security.password_hasher._submit = inline
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+        probe_latencies = []
+        statuses = {}
+
+        async def probe():
+            # Latency is measured from when each probe was due, so time the
+            # event loop spent blocked counts against it
+            interval = 0.01
+            due = time.perf_counter()
+            while not done.is_set():
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - due)
+                due += interval
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+
+        remaining = iter(range(args.logins))
+
+        async def login_worker():
+            for _ in remaining:
+                response = await client.post("/login", json={"email": "bench@example.com", "password": "pw"})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"mode:            {'inline bcrypt' if args.inline else 'worker pool'}")
+    print(f"logins:          {args.logins} in {elapsed:.2f}s ({args.logins / elapsed:.1f} req/s)")
+    print(f"login statuses:  {statuses}")
+    print(f"probe requests:  {len(probe_latencies)}")
+    print(f"probe p50:       {statistics.median(probe_latencies) * 1000:.1f} ms")
+    print(f"probe p99:       {percentile(probe_latencies, 99) * 1000:.1f} ms")
+    print(f"probe max:       {max(probe_latencies) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--inline", action="store_true", help="verify bcrypt on the event loop")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,89 @@
+"""Client placement simulation.
+
+Places clients one by one with the real Scheduler against simulated Docker
+hosts (no daemon needed) and reports how clients and memory spread across
+them, and where placement starts refusing. Each placed client is fed back
+as a container start event plus a stats sample, as the events consumer and
+stats collector would. Run from backend/:
+
+    python -m benchmarks.placement --hosts a=16g,b=16g,c=16g --clients 60
+    python -m benchmarks.placement --hosts a=8g,b=16g,c=32g --mem-limit 1g --clients 100
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ENCRYPTION_KEY", "ZGVmYXVsdC1iZW5jaG1hcmstZW5jcnlwdGlvbi1rZXk=")
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+from docker.utils import parse_bytes
+
+from core.cache import TTLCache
+from core.config import settings
+from services.container_index import ContainerIndex
+from services.scheduler import CapacityError, Scheduler
+
+class SimulatedScheduler(Scheduler):
+    def __init__(self, index, stats, memory: dict):
+        super().__init__(index, stats, hosts=list(memory))
+        self.memory = memory
+
+    def host_info(self, host: str) -> dict:
+        return {"memory": self.memory[host], "cpus": 8}
+
+def start_event(ign: str, host: str) -> dict:
+    return {
+        "Action": "start",
+        "Actor": {"ID": f"{host}-{ign}", "Attributes": {"name": f"mc-client-{ign}"}},
+        "timeNano": time.time_ns()
+    }
+
+def run(args):
+    settings.CLIENT_MEM_LIMIT = args.mem_limit
+    settings.HOST_MAX_CLIENTS = args.max_clients
+    memory = {
+        name: parse_bytes(size)
+        for name, size in (host.split("=") for host in args.hosts.split(","))
+    }
+    low, high = (parse_bytes(size) for size in args.usage.split("-"))
+    random.seed(args.seed)
+
+    index = ContainerIndex()
+    stats = TTLCache(maxsize=100000, ttl=3600)
+    scheduler = SimulatedScheduler(index, stats, memory)
+    placed = refused = 0
+    for n in range(args.clients):
+        ign = f"Player{n}"
+        try:
+            host = scheduler.place(ign)
+        except CapacityError:
+            refused += 1
+            continue
+        stats.set(ign, {"memory_usage": random.randint(low, high)})
+        index.apply(start_event(ign, host), host)
+        placed += 1
+
+    print(f"placed {placed}, refused {refused}")
+    print(f"{'host':<8} {'RAM':>7} {'clients':>8} {'used':>8} {'load':>6}")
+    for host in memory:
+        load = scheduler.load(host)
+        used = sum(stats.peek(entry.ign)["memory_usage"] for entry in index.running(host))
+        print(
+            f"{host:<8} {memory[host] / 2**30:>6.0f}G {load['clients']:>8} "
+            f"{used / 2**30:>7.1f}G {load['committed'] / load['budget']:>6.0%}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", default="a=16g,b=16g,c=16g", help="name=RAM pairs")
+    parser.add_argument("--clients", type=int, default=60)
+    parser.add_argument("--mem-limit", default="768m", help="CLIENT_MEM_LIMIT; empty for observed usage only")
+    parser.add_argument("--usage", default="300m-700m", help="range of simulated client memory usage")
+    parser.add_argument("--max-clients", type=int, default=0, help="HOST_MAX_CLIENTS")
+    parser.add_argument("--seed", type=int, default=1)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
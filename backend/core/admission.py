@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+from core.cache import TTLCache
+from core import metrics
+import asyncio
+import threading
+import time
+
+class LifecycleBusy(RuntimeError):
+    """Too many container starts/stops are already running"""
+
+class RateLimiter:
+    """Token buckets per key: rate_per_minute tokens refill continuously up to burst.
+
+    A bucket is forgotten once it would have refilled completely, so idle
+    keys cost nothing and maxsize only bounds concurrently active ones.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, maxsize: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.buckets = TTLCache(maxsize=maxsize, ttl=burst / self.rate if self.rate else 0)
+        self._lock = threading.Lock()
+
+    def take(self, key) -> float:
+        """Spend one token; returns 0 if allowed, else the seconds until a token is available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.buckets.peek(key)
+            tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens < 1:
+                return (1 - tokens) / self.rate
+            self.buckets.set(key, (tokens - 1, now))
+            return 0.0
+
+class ConcurrencyLimit:
+    """Caps how many operations run at once across every thread of the process"""
+
+    def __init__(self, limit: int):
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    @contextmanager
+    def slot(self, timeout: float):
+        """Hold a slot for the block; raises LifecycleBusy after waiting timeout seconds"""
+        if self._slots is not None and not self._slots.acquire(timeout=timeout):
+            metrics.LIFECYCLE_REJECTIONS.labels(reason="busy").inc()
+            raise LifecycleBusy("Too many sessions are being started or stopped, please retry")
+        metrics.LIFECYCLE_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            metrics.LIFECYCLE_IN_FLIGHT.dec()
+            if self._slots is not None:
+                self._slots.release()
+
+class SingleFlight:
+    """Coalesces concurrent calls of one action on one IGN; every caller gets its result or exception.
+
+    The shared operation is shielded, so a caller that disconnects does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}  # (action, ign) -> future of the operation in flight
+
+    async def do(self, action: str, ign: str, operation):
+        key = (action, ign)
+        future = self._calls.get(key)
+        if future is not None:
+            metrics.LIFECYCLE_COALESCED.labels(action=action).inc()
+        else:
+            future = asyncio.ensure_future(operation())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(future)
+
+    def _done(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()  # Retrieved even if every caller went away
@@ -11,14 +11,115 @@ class Settings(BaseSettings):
     @property
     def DATABASE_URL(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+    @property
+    def ASYNC_DATABASE_URL(self):
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+    DB_ASYNC: bool = False  # Serve API queries through AsyncSession + asyncpg
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 5000  # 0 disables the server-side timeout
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_TTL: float = 60.0  # Upper bound on staleness of admin/active flags
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    WHITELIST_RESYNC_INTERVAL: float = 300.0  # Full reload as a safety net for missed notifications
+    WHITELIST_PAGE_SIZE: int = 1000
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt threads; keep below the CPU count
+    PASSWORD_HASH_MAX_PENDING: int = 32  # Running + queued hashes before answering 503
+    # Named Docker endpoints for AFK clients, e.g. {"node1": "tcp://10.0.0.2:2375"}; empty = local daemon.
+    # The first one also hosts the server container.
+    DOCKER_HOSTS: dict[str, str] = {}
     DOCKER_NETWORK: str = "afk_network"
     DOCKER_MC_IMAGE: str = "afk-minecraft"
+    DOCKER_MAX_POOL_SIZE: int = 32  # Pooled HTTP connections; keep >= the worker counts below
+    DOCKER_TIMEOUT: int = 60
+    DOCKER_HEALTH_CHECK_INTERVAL: float = 30.0  # Seconds between daemon pings
+    DOCKER_LIFECYCLE_WORKERS: int = 4  # Lifecycle threads beyond one per LIFECYCLE_MAX_CONCURRENCY slot
+    LIFECYCLE_RATE_PER_MINUTE: float = 6.0  # Session starts/stops a user may make per minute; 0 disables
+    LIFECYCLE_RATE_BURST: int = 4
+    LIFECYCLE_RATE_MAX_USERS: int = 10000  # Users with a partly spent bucket tracked at once
+    LIFECYCLE_MAX_CONCURRENCY: int = 8  # Container starts/stops running at once per worker; 0 is unlimited
+    LIFECYCLE_QUEUE_TIMEOUT: float = 30.0  # Seconds a start/stop waits for a slot before failing with 503
+    DOCKER_INSPECT_WORKERS: int = 6  # Concurrent status/stats/logs calls
+    CLIENT_MEM_LIMIT: str = ""  # Per-client memory cap, e.g. "768m"; also the scheduler's per-client reservation
+    CLIENT_NANO_CPUS: int = 0  # Per-client CPU quota in 1e-9 CPUs, e.g. 500000000 for half a core
+    CLIENT_CPUSET_CPUS: str = ""  # Pin clients to these CPUs, e.g. "1-3"
+    HOST_MAX_CLIENTS: int = 0  # Clients per Docker host; 0 = limited by memory only
+    HOST_MEMORY_FRACTION: float = 0.9  # Share of a host's RAM the scheduler may fill with clients
+    HOST_INFO_TTL: float = 300.0  # Seconds between refreshes of each host's MemTotal/NCPU
+    WARM_POOL_SIZE: int = 0  # Idle pre-started client containers per host; 0 disables the pool
+    WARM_POOL_REFILL_INTERVAL: float = 2.0  # Minimum seconds between warm container creations
+    # Every client, warm or cold, keeps /data under <volume>/<ign>; run migrate_volumes.py once
+    # to move the per-IGN mc-data-<ign> volumes of older versions into it
+    CLIENT_DATA_VOLUME: str = "mc-data"
+    SUPERVISOR_ENABLED: bool = True  # Restart clients from the backend instead of Docker's restart policy
+    SUPERVISOR_BACKOFF_BASE: float = 5.0  # Seconds before the first restart, doubled per recent restart
+    SUPERVISOR_BACKOFF_MAX: float = 300.0
+    SUPERVISOR_MAX_RESTARTS: int = 5  # Restarts within the window before a session is marked failed
+    SUPERVISOR_RESTART_WINDOW: float = 1800.0
+    SUPERVISOR_CHECK_INTERVAL: float = 60.0  # Seconds between whitelist/silence sweeps
+    SUPERVISOR_SILENCE_TIMEOUT: float = 0.0  # Restart clients with no log output for this long; 0 disables
+    SUPERVISOR_FAILURE_CACHE_TTL: float = 15.0  # Seconds /status reuses a session's failed/not-failed lookup
+    SUPERVISOR_FAILURE_CACHE_MAX_ENTRIES: int = 10000
+    SUPERVISOR_KICK_PATTERNS: list[str] = [
+        r"\b(?:kicked|disconnected|lost connection|connection (?:refused|reset|timed out))\b"
+    ]
+    SUPERVISOR_AUTH_PATTERNS: list[str] = [
+        r"\b(?:invalid (?:session|credentials)|failed to (?:log ?in|authenticate)|authentication (?:failed|error))\b"
+    ]
+    BULK_PARALLELISM: int = 16  # Concurrent container starts/stops in an admin bulk operation
+    BULK_MAX_ATTEMPTS: int = 3
+    BULK_RETRY_BASE_DELAY: float = 1.0  # Seconds, doubled per retry with jitter
+    BULK_RETRY_MAX_DELAY: float = 15.0
+    READY_CHECK_TIMEOUT: float = 2.0  # Seconds each /ready dependency check may take
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5  # Seconds between event loop lag probes
+    STATS_CACHE_TTL: float = 30.0  # Snapshots not refreshed within this are dropped
+    STATS_CACHE_MAX_ENTRIES: int = 1000
+    STATS_HISTORY_MAX_SERIES: int = 2000  # IGNs with in-memory history (~20 KB each)
+    STATS_HISTORY_FLUSH_INTERVAL: float = 300.0  # Seconds between hourly rollup upserts
+    STATS_HISTORY_RETENTION_DAYS: int = 90  # Hourly rollups older than this are deleted
+    LOG_BUFFER_LINES: int = 200  # Recent log lines kept per client
+    LOG_SUBSCRIBER_QUEUE_SIZE: int = 500  # Events buffered per push subscriber
+    LOG_ARCHIVE_DIR: str = "logs"  # Compressed client log segments; empty disables the archive
+    LOG_ARCHIVE_BLOCK_BYTES: int = 64 * 1024  # Uncompressed bytes per gzip member / index entry
+    LOG_ARCHIVE_FLUSH_INTERVAL: float = 5.0  # Seconds before a partial block is compressed anyway
+    LOG_ARCHIVE_SEGMENT_BYTES: int = 16 * 1024 * 1024  # Compressed size at which a segment rotates
+    LOG_ARCHIVE_SEGMENT_SECONDS: float = 86400.0  # Age at which a segment rotates
+    LOG_ARCHIVE_RETENTION_DAYS: int = 14
+    LOG_ARCHIVE_PRUNE_INTERVAL: float = 3600.0  # Seconds between retention sweeps over every IGN's segments
+    CLIENT_LOG_MAX_SIZE: str = "10m"  # Docker json-file limit per client container log file
+    CLIENT_LOG_MAX_FILES: int = 3
+    EVENTS_KEEPALIVE_INTERVAL: float = 15.0
+    STREAM_TICKET_TTL: float = 30.0  # Seconds a /minecraft/events ticket stays redeemable
+    ITEM_FLUSH_INTERVAL: float = 10.0  # Seconds between batched item_stats upserts
+    ITEM_PENDING_MAX_KEYS: int = 10000  # Distinct (ign, item, rarity) buffered before an early flush
+    ITEM_SUMMARY_CACHE_TTL: float = 60.0
+    ITEM_SUMMARY_CACHE_MAX_ENTRIES: int = 10000
+    # Named groups: item (required), count, rarity, shiny
+    ITEM_PICKUP_PATTERNS: list[str] = [
+        r"\b(?:picked up|collected|obtained|received)\s+(?:(?P<count>\d+)x?\s+)?"
+        r"(?P<shiny>shiny\s+)?(?:\[?(?P<rarity>common|uncommon|rare|epic|legendary|ultra)\]?\s+)?"
+        r"(?P<item>[\w' -]+?)(?:\s+x(?P<count_suffix>\d+))?\s*[.!]?$"
+    ]
+    STATE_BACKEND: str = "postgres"  # "postgres" shares state across workers/nodes, "memory" is single-process
+    LEADER_CHECK_INTERVAL: float = 5.0  # Seconds between leader lock acquire/confirm attempts
+    RELAY_INTERVAL: float = 0.5  # Seconds the leader batches log lines and stats before relaying them to followers
+    RELAY_MAX_PENDING: int = 20000  # Relay messages buffered between batches; the oldest are dropped beyond this
+    RELAY_RESYNC_INTERVAL: float = 300.0  # Followers relist containers as a safety net for missed notifications
+    LOG_CURSOR_SAVE_INTERVAL: float = 10.0  # Seconds between saves of the leader's log positions, replayed by the next leader
+    CLIENT_LOCK_TIMEOUT: float = 30.0  # Seconds a start/stop waits for another one on the same IGN
+    SERVER_MODE: str = "process"  # "process" runs SERVER_COMMAND here, "docker" the mc-server container
+    SERVER_DIR: str = "/minecraft"
+    SERVER_COMMAND: list[str] = ["java", "-Xmx1024M", "-Xms1024M", "-jar", "server.jar", "nogui"]
+    SERVER_OUTPUT_LINES: int = 1000  # Server output kept in memory
+    SERVER_STOP_TIMEOUT: float = 60.0  # Seconds to save and exit before the server is killed
     MC_SERVER: str = "localhost"
     MC_PORT: int = 25565
-    ENCRYPTION_KEY: str = os.getenv("ENCRYPTION_KEY")  # 'ZGVmYXVsdC1zZWNyZXQta2V5' is 'default-encryption-key' encoded in base64
+    ENCRYPTION_KEY: str = os.getenv("ENCRYPTION_KEY", "")  # Checked on first use and by /ready; 'ZGVmYXVsdC1zZWNyZXQta2V5' is 'default-encryption-key' encoded in base64
 
     class Config:
         case_sensitive = True
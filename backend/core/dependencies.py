@@ -1,23 +1,52 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from main import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models.user import User
+from core.admission import RateLimiter
+from core.cache import TTLCache
 from core.config import settings
-from core.security import verify_password
+from core import metrics
 from schemas.token import TokenData
+from services.state import get_state_backend
+import math
+import secrets
+import time
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@dataclass(frozen=True)
+class Principal:
+    """The verified identity behind a bearer token"""
+    id: int
+    email: str
+    ign: str
+    is_admin: bool
+    is_active: bool
+
+# Verified principals keyed by token, so repeat requests skip the JWT decode and user query
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.PRINCIPAL_CACHE_TTL
+)
+metrics.register_cache("principals", principal_cache)
+
+def invalidate_principals(email: str = None, ign: str = None):
+    """Drop cached principals for a user whose admin, active or whitelist status changed"""
+    principal_cache.discard_where(
+        lambda principal: (email is not None and principal.email == email)
+        or (ign is not None and principal.ign == ign)
+    )
+
+async def resolve_principal(token: str, db: AsyncSession) -> Principal:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -32,12 +61,97 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = await db.scalar(select(User).where(User.email == token_data.email))
     if user is None:
         raise credentials_exception
-    return user
+    principal = principal_of(user)
+    # Never cache a principal past its token's expiry
+    ttl = settings.PRINCIPAL_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        principal_cache.set(token, principal, ttl=ttl)
+    return principal
+
+def principal_of(user: User) -> Principal:
+    return Principal(
+        id=user.id,
+        email=user.email,
+        ign=user.ign,
+        is_admin=bool(user.is_admin),
+        is_active=bool(user.is_active)
+    )
+
+# Most stream tickets a user may hold at once (one per open dashboard, roughly)
+STREAM_TICKETS_PER_USER = 10
+
+def issue_stream_ticket(principal: Principal) -> str:
+    """Short-lived, single-use credential for /minecraft/events, whose EventSource cannot send headers.
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+    Kept in the state backend so any worker can redeem it; the bearer
+    token itself never goes into a URL.
+    """
+    secret = secrets.token_urlsafe(32)
+    now = time.time()
+    backend = get_state_backend()
+    key = f"stream_tickets:{principal.id}"
+    with backend.lock(key, settings.CLIENT_LOCK_TIMEOUT):
+        tickets = {held: expires for held, expires in (backend.get(key) or {}).items() if expires > now}
+        tickets[secret] = now + settings.STREAM_TICKET_TTL
+        newest = sorted(tickets.items(), key=lambda ticket: ticket[1])[-STREAM_TICKETS_PER_USER:]
+        backend.set(key, dict(newest))
+    return f"{principal.id}.{secret}"
+
+def redeem_stream_ticket(ticket: str):
+    """Spend a stream ticket; returns the user id it was issued to, or None if unknown, used or expired"""
+    user_id, _, secret = ticket.partition(".")
+    if not user_id.isdigit() or not secret:
+        return None
+    now = time.time()
+    backend = get_state_backend()
+    key = f"stream_tickets:{user_id}"
+    with backend.lock(key, settings.CLIENT_LOCK_TIMEOUT):
+        tickets = backend.get(key) or {}
+        expires = tickets.pop(secret, None)
+        live = {held: until for held, until in tickets.items() if until > now}
+        backend.set(key, live or None)
+    if expires is None or expires <= now:
+        return None
+    return int(user_id)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    return await resolve_principal(token, db)
+
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+async def get_current_admin(current_user: Principal = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+# Per-user session start/stop budget (per worker)
+lifecycle_limiter = RateLimiter(
+    rate_per_minute=settings.LIFECYCLE_RATE_PER_MINUTE,
+    burst=settings.LIFECYCLE_RATE_BURST,
+    maxsize=settings.LIFECYCLE_RATE_MAX_USERS
+)
+
+def spend_lifecycle_token(current_user: Principal):
+    """Spend one of the user's start/stop tokens, or reject with 429 and Retry-After"""
+    if settings.LIFECYCLE_RATE_PER_MINUTE > 0:
+        retry_after = lifecycle_limiter.take(current_user.id)
+        if retry_after:
+            metrics.LIFECYCLE_REJECTIONS.labels(reason="rate_limited").inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many session starts/stops, please slow down",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+async def limit_lifecycle(current_user: Principal = Depends(get_current_active_user)):
+    """Dependency spending a start/stop token before the route runs"""
+    spend_lifecycle_token(current_user)
+    return current_user
@@ -0,0 +1,130 @@
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import time
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from request to response headers, by route template",
+    ["method", "route", "status"]
+)
+
+# Hot paths
+DOCKER_CALL_DURATION = Histogram(
+    "docker_call_duration_seconds",
+    "Docker API call latency (for streams, the time to open them)",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DOCKER_CALL_ERRORS = Counter("docker_call_errors_total", "Docker API calls that raised", ["operation"])
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "bcrypt time per call, excluding queueing", ["operation"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2, 5)
+)
+FERNET_DURATION = Histogram(
+    "fernet_duration_seconds", "Fernet encrypt/decrypt time", ["operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database statement execution time", ["engine", "statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled wakeup",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+RUNNING_CLIENTS = Gauge("afk_running_clients", "AFK client containers currently running")
+
+class RequestTimingMiddleware:
+    """ASGI middleware observing HTTP_REQUEST_DURATION when response headers go out.
+
+    Timing to headers rather than to the last body chunk keeps long-lived
+    streams (SSE, NDJSON) from swamping the histogram.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                HTTP_REQUEST_DURATION.labels(
+                    method=scope["method"],
+                    route=route.path if route is not None else "unmatched",
+                    status=message["status"]
+                ).observe(time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+# Database connection pool
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Pool checkouts that gave up after DB_POOL_TIMEOUT"
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Database connections checked out of the pool", ["engine"]
+)
+DB_POOL_IDLE = Gauge("db_pool_connections_idle", "Database connections idle in the pool", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond DB_POOL_SIZE", ["engine"])
+
+# AFK client sessions
+SESSION_READY_SECONDS = Histogram(
+    "afk_session_ready_seconds",
+    "Time from a start request until the client container is running with the session bound",
+    ["path"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+)
+WARM_POOL_IDLE = Gauge("afk_warm_pool_idle", "Warm client containers waiting to be claimed", ["host"])
+HOST_CLIENTS = Gauge("afk_host_clients", "AFK clients running or being placed on a Docker host", ["host"])
+HOST_MEMORY_LOAD = Gauge(
+    "afk_host_memory_load", "Committed client memory as a share of the host's client budget", ["host"]
+)
+PLACEMENT_REJECTIONS = Counter("afk_placement_rejections_total", "Client starts refused because every host was full")
+
+SUPERVISOR_RESTARTS = Counter("afk_supervisor_restarts_total", "Client restarts issued by the supervisor", ["reason"])
+SUPERVISOR_STOPS = Counter("afk_supervisor_stops_total", "Clients stopped by the supervisor", ["reason"])
+LIFECYCLE_REJECTIONS = Counter(
+    "afk_lifecycle_rejections_total", "Session starts/stops refused by admission control", ["reason"]
+)
+LIFECYCLE_IN_FLIGHT = Gauge("afk_lifecycle_in_flight", "Container starts/stops currently running")
+LIFECYCLE_COALESCED = Counter(
+    "afk_lifecycle_coalesced_total", "Start/stop requests that joined one already in flight for the IGN", ["action"]
+)
+SESSIONS_FAILED = Counter("afk_sessions_failed_total", "Sessions the supervisor gave up on", ["reason"])
+
+class CacheCollector:
+    """Exports hit/miss/size of the registered TTLCaches"""
+
+    def __init__(self):
+        self.caches = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found a live entry", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found nothing", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries currently cached", labels=["cache"])
+        hit_ratio = GaugeMetricFamily("cache_hit_ratio", "Share of lookups served from the cache", labels=["cache"])
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            entries.add_metric([name], len(cache))
+            lookups = cache.hits + cache.misses
+            hit_ratio.add_metric([name], cache.hits / lookups if lookups else 0)
+        return [hits, misses, entries, hit_ratio]
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+def register_cache(name: str, cache):
+    """Expose a TTLCache's hit/miss counters under the given name"""
+    cache_collector.caches[name] = cache
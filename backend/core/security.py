@@ -2,27 +2,41 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import HTTPException, status
 from core.config import settings
+from core import metrics
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.fernet import Fernet
 import base64
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
 logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+_fernet = None
+
+def get_pwd_context() -> CryptContext:
+    """bcrypt CryptContext, built on first use"""
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
-# Encryption setup
-fernet = Fernet(settings.ENCRYPTION_KEY.encode())
+def get_fernet() -> Fernet:
+    """Fernet for ENCRYPTION_KEY, built on first use so a missing key only fails what needs it"""
+    global _fernet
+    if _fernet is None:
+        if not settings.ENCRYPTION_KEY:
+            raise RuntimeError("ENCRYPTION_KEY is not set")
+        _fernet = Fernet(settings.ENCRYPTION_KEY.encode())
+    return _fernet
 
 def encrypt_data(data: str) -> str:
     """Encrypt sensitive data"""
     try:
-        return fernet.encrypt(data.encode()).decode()
+        with metrics.FERNET_DURATION.labels(operation="encrypt").time():
+            return get_fernet().encrypt(data.encode()).decode()
     except Exception as e:
         logger.error(f"Encryption failed: {e}")
         raise
@@ -30,7 +44,8 @@ def encrypt_data(data: str) -> str:
 def decrypt_data(encrypted_data: str) -> str:
     """Decrypt sensitive data""" 
     try:
-        return fernet.decrypt(encrypted_data.encode()).decode()
+        with metrics.FERNET_DURATION.labels(operation="decrypt").time():
+            return get_fernet().decrypt(encrypted_data.encode()).decode()
     except Exception as e:
         logger.error(f"Decryption failed: {e}")
         raise
@@ -38,14 +53,73 @@ def decrypt_data(encrypted_data: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hashed version"""
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
     except Exception as e:
         logger.error(f"Password verification failed: {e}")
         return False
 
 def get_password_hash(password: str) -> str:
     """Generate a hashed version of the password"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL, so hashing on threads keeps the event loop
+    free without the cost of a process pool. Once PASSWORD_HASH_MAX_PENDING
+    calls are running or queued, new ones are rejected with 503 instead of
+    piling up behind the pool.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="bcrypt"
+        )
+        self.pending = 0
+        self.ready = False
+
+    async def warm_up(self):
+        """Load passlib's bcrypt backend (and run its self-tests) before the first login pays for it"""
+        def warm():
+            get_pwd_context().handler("bcrypt").get_backend()
+        await asyncio.get_running_loop().run_in_executor(self._executor, warm)
+        self.ready = True
+
+    async def _submit(self, func, *args):
+        if self.pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str):
+        """Verify a password; returns (valid, new_hash) where new_hash is set if the stored hash is deprecated"""
+        def verify_and_update():
+            try:
+                with metrics.PASSWORD_HASH_DURATION.labels(operation="verify").time():
+                    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+            except Exception as e:
+                logger.error(f"Password verification failed: {e}")
+                return False, None
+        return await self._submit(verify_and_update)
+
+    async def hash(self, password: str) -> str:
+        def hash_password():
+            with metrics.PASSWORD_HASH_DURATION.labels(operation="hash").time():
+                return get_pwd_context().hash(password)
+        return await self._submit(hash_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -61,29 +135,3 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     except JWTError as e:
         logger.error(f"Token creation failed: {e}")
         raise
-
-def verify_token(token: str) -> bool:
-    """Verify a JWT token"""
-    try:
-        jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return True
-    except JWTError as e:
-        logger.warning(f"Token verification failed: {e}")
-        return False
-
-def is_admin(user: dict) -> bool:
-    """Check if user has admin privileges"""
-    return user.get("is_admin", False)
-
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
-    """Get current user from JWT token"""
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
-    except JWTError as e:
-        logger.error(f"Token decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
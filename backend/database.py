@@ -1,9 +1,176 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from core.config import settings
+from core import metrics
+import threading
+import time
+
+class CheckoutTimerMixin:
+    """Records how long each pool checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+class InstrumentedQueuePool(CheckoutTimerMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(CheckoutTimerMixin, AsyncAdaptedQueuePool):
+    pass
+
+def engine_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def track_pool(engine, name: str):
+    pool = engine.pool
+    metrics.DB_POOL_IN_USE.labels(engine=name).set_function(lambda: pool.checkedout())
+    metrics.DB_POOL_IDLE.labels(engine=name).set_function(lambda: pool.checkedin())
+    metrics.DB_POOL_OVERFLOW.labels(engine=name).set_function(lambda: max(pool.overflow(), 0))
+
+def time_queries(engine, name: str):
+    """Observe every statement's execution time in DB_QUERY_DURATION"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        metrics.DB_QUERY_DURATION.labels(engine=name, statement=verb).observe(elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker that creates the engines on the first session rather than at import"""
+
+    def __call__(self, **local_kw):
+        init_engines()
+        return super().__call__(**local_kw)
 
-# Database setup
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
+engine = None
+async_engine = None
+AsyncSessionLocal = None
+_engine_lock = threading.Lock()
+
+def init_engines():
+    """Create the sync (and, with DB_ASYNC, async) engine once; no connection is opened yet"""
+    global engine, async_engine, AsyncSessionLocal
+    if engine is not None:
+        return engine
+    with _engine_lock:
+        if engine is not None:
+            return engine
+        sync_connect_args = {}
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            sync_connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        sync_engine = create_engine(
+            settings.DATABASE_URL,
+            poolclass=InstrumentedQueuePool,
+            connect_args=sync_connect_args,
+            **engine_options()
+        )
+        SessionLocal.configure(bind=sync_engine)
+        track_pool(sync_engine, "sync")
+        time_queries(sync_engine, "sync")
+
+        if settings.DB_ASYNC:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            async_connect_args = {}
+            if settings.DB_STATEMENT_TIMEOUT_MS:
+                async_connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+            async_engine = create_async_engine(
+                settings.ASYNC_DATABASE_URL,
+                poolclass=InstrumentedAsyncQueuePool,
+                connect_args=async_connect_args,
+                **engine_options()
+            )
+            AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+            track_pool(async_engine.sync_engine, "async")
+            time_queries(async_engine.sync_engine, "async")
+        engine = sync_engine
+    return engine
+
+def get_engine():
+    """The shared sync engine, created on first use"""
+    return init_engines()
+
+class ThreadedSession:
+    """AsyncSession-compatible wrapper running a sync Session on the threadpool.
+
+    Lets routes use one awaitable query style whether or not DB_ASYNC is on;
+    either way the event loop never blocks on a query.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+async def get_async_db():
+    """FastAPI dependency yielding an awaitable session.
+
+    An AsyncSession on asyncpg when DB_ASYNC is enabled, otherwise the sync
+    session wrapped in ThreadedSession.
+    """
+    init_engines()
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
@@ -1,5 +1,7 @@
-from database import Base, engine
+from database import Base, SessionLocal, get_engine
 from models.user import User
+from services.item_tracker import migrate_item_stats, rebuild_item_summaries
+from services.whitelist import install_notify_triggers
 # Import other models here as needed
 import logging
 
@@ -9,8 +11,18 @@ logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
 def init_db():
     print("Starting database initialization...")
     print(f"Creating tables for: {Base.metadata.tables.keys()}")
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     print("Database tables initialized successfully")
+    migrate_item_stats()
+    print("item_stats deduplicated and unique key ensured")
+    install_notify_triggers()
+    print("Whitelist change notifications installed")
+    db = SessionLocal()
+    try:
+        rebuild_item_summaries(db)
+        print("Item summaries rebuilt from item_stats")
+    finally:
+        db.close()
 
 if __name__ == "__main__":
     init_db()
@@ -1,8 +1,160 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from core import metrics
+from core.config import settings
+from core.security import get_fernet, password_hasher
+from database import get_async_db
 from routers import auth, minecraft
+from services.docker_manager import docker_hosts, get_async_docker_manager, close_async_docker_manager
+from services.container_index import get_container_index
+from services.log_stream import get_log_hub
+from services.stats_collector import get_stats_collector
+from services.item_tracker import get_item_tracker
+from services.stats_history import get_stats_history
+from services.log_archive import get_log_archive
+from services.whitelist import get_whitelist_cache
+from services.orchestrator import close_orchestrator
+from services.relay import get_relay
+from services.warm_pool import get_warm_pool
+from services.supervisor import get_supervisor
+from services.server_process import get_server
+from services.state import get_state_backend
 
-app = FastAPI(title="Minecraft AFK Service")
+logger = logging.getLogger(__name__)
+
+async def docker_health_check():
+    """Connect to the Docker daemon, then ping it periodically so a restart triggers a reconnect"""
+    while True:
+        try:
+            await get_async_docker_manager().ping()
+        except Exception as e:
+            logger.error(f"Docker health check failed: {e}")
+        await asyncio.sleep(settings.DOCKER_HEALTH_CHECK_INTERVAL)
+
+async def event_loop_lag_monitor():
+    """Measure how late the loop wakes up from a fixed sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + settings.EVENT_LOOP_LAG_INTERVAL
+        await asyncio.sleep(settings.EVENT_LOOP_LAG_INTERVAL)
+        metrics.EVENT_LOOP_LAG.observe(max(loop.time() - scheduled, 0))
+
+async def start_leader_services() -> list:
+    """Start the Docker consumers and background writers that must run in exactly one worker; returns their tasks"""
+    if settings.SUPERVISOR_ENABLED:
+        get_supervisor().start()
+    if settings.LOG_ARCHIVE_DIR:
+        get_log_hub().add_sink(get_log_archive().handle_line)
+    if settings.WARM_POOL_SIZE > 0:
+        for host in docker_hosts():
+            get_warm_pool(host).start()
+    get_item_tracker().persisting = True
+    # After the sinks, so log lines replayed from the last leader's cursors reach them
+    await asyncio.to_thread(get_relay().lead)
+    tasks = [
+        asyncio.create_task(get_item_tracker().run()),
+        asyncio.create_task(get_stats_history().run())
+    ]
+    if settings.LOG_ARCHIVE_DIR:
+        tasks.append(asyncio.create_task(get_log_archive().run()))
+    return tasks
+
+async def stop_leader_services(tasks: list):
+    # Stop reading Docker first, so every line read has reached the sinks before they flush
+    await asyncio.to_thread(get_relay().follow)
+    for task in tasks:
+        task.cancel()
+    get_item_tracker().persisting = False
+    await asyncio.to_thread(get_item_tracker().flush)
+    await asyncio.to_thread(get_stats_history().flush)
+    if settings.LOG_ARCHIVE_DIR:
+        get_log_hub().remove_sink(get_log_archive().handle_line)
+        await asyncio.to_thread(get_log_archive().flush)
+    try:
+        await asyncio.to_thread(get_relay().save_cursors)
+    except Exception as e:
+        logger.error(f"Failed to save log cursors for the next leader: {e}")
+    if settings.SUPERVISOR_ENABLED:
+        get_supervisor().stop()
+    for host in docker_hosts():
+        get_warm_pool(host).stop()
+
+async def campaign():
+    """Hold (or keep trying for) the leader lock and run the leader services while holding it.
+
+    A worker that loses leadership stops them and keeps campaigning, so it
+    can take over again later.
+    """
+    backend = get_state_backend()
+    tasks = None
+    try:
+        while True:
+            try:
+                leader = await asyncio.to_thread(backend.hold_leadership)
+            except Exception as e:
+                logger.error(f"Leader election failed: {e}")
+                leader = False
+            if leader and tasks is None:
+                logger.info("Elected leader, starting background writers")
+                tasks = await start_leader_services()
+            elif not leader and tasks is not None:
+                logger.warning("Lost leadership, stopping background writers")
+                await stop_leader_services(tasks)
+                tasks = None
+            await asyncio.sleep(settings.LEADER_CHECK_INTERVAL)
+    finally:
+        if tasks is not None:
+            await stop_leader_services(tasks)
+            await asyncio.to_thread(backend.release_leadership)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start everything in the background and serve at once; /ready says when dependencies are up"""
+    started = time.perf_counter()
+    health_check = asyncio.create_task(docker_health_check())
+    lag_monitor = asyncio.create_task(event_loop_lag_monitor())
+    warm_up = asyncio.create_task(password_hasher.warm_up())
+    # Every worker serves /status, the SSE streams and recent logs from its own index,
+    # stats and log hub, but only the leader reads Docker's streams; followers apply what
+    # it relays. Register index listeners and log sinks before the index loads
+    get_stats_collector().add_listener(get_stats_history().record)
+    get_item_tracker().add_listener(get_stats_history().record_items)
+    get_item_tracker().persisting = False
+    get_log_hub().add_sink(get_item_tracker().handle_line)
+    election = asyncio.create_task(campaign())
+    get_relay().follow()
+    get_whitelist_cache().start()
+    logger.info(f"Startup finished in {time.perf_counter() - started:.3f}s")
+    yield
+    health_check.cancel()
+    warm_up.cancel()
+    lag_monitor.cancel()
+    try:
+        await get_server().shutdown()
+    except Exception as e:
+        logger.error(f"Failed to stop the Minecraft server: {e}")
+    election.cancel()
+    try:
+        await election
+    except asyncio.CancelledError:
+        pass
+    get_relay().stop()
+    get_stats_collector().stop()
+    get_log_hub().stop()
+    get_container_index().stop()
+    get_whitelist_cache().stop()
+    close_orchestrator()
+    await asyncio.to_thread(close_async_docker_manager)
+    password_hasher.shutdown()
+
+app = FastAPI(title="Minecraft AFK Service", lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -13,6 +165,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.RequestTimingMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(minecraft.router)
@@ -21,6 +175,41 @@ app.include_router(minecraft.router)
 async def root():
     return {"message": "Minecraft AFK Service"}
 
+async def probe(check) -> str:
+    try:
+        result = await asyncio.wait_for(check, settings.READY_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        return "timeout"
+    except Exception as e:
+        return f"error: {e}"
+    return "unreachable" if result is False else "ok"
+
+def crypto_state() -> str:
+    try:
+        get_fernet()
+    except Exception as e:
+        return f"error: {e}"
+    return "ok" if password_hasher.ready else "warming"
+
+@app.get("/ready")
+async def ready(response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Readiness probe: 200 once every dependency is usable, else 503; reports each one's state"""
+    checks = {
+        "database": await probe(db.execute(text("SELECT 1"))),
+        "docker": await probe(get_async_docker_manager().ping()),
+        "crypto": crypto_state(),
+        "container_index": "ok" if get_container_index().loaded else "loading",
+        "whitelist": "ok" if get_whitelist_cache().loaded else "loading"
+    }
+    ready = all(state == "ok" for state in checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "checks": checks}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,16 @@
+from core.config import settings
+from services.docker_manager import docker_hosts, get_docker_manager
+
+# Older versions gave every cold-started client its own mc-data-<ign> volume,
+# while warm clients used <CLIENT_DATA_VOLUME>/<ign>. Every client now uses the
+# shared layout; run this once per deployment (stop the clients first, since a
+# volume still in use is skipped) to carry existing users' data over.
+
+def migrate_volumes():
+    print(f"Migrating per-IGN data volumes into {settings.CLIENT_DATA_VOLUME}...")
+    for host in docker_hosts():
+        migrated = get_docker_manager(host).migrate_legacy_volumes()
+        print(f"Migrated {migrated} volumes on {host}")
+
+if __name__ == "__main__":
+    migrate_volumes()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Float, Integer, String, Boolean, UniqueConstraint, func
 from models.base import Base
 
 class User(Base):
@@ -23,6 +23,9 @@ class Whitelist(Base):
 
 class ItemStat(Base):
     __tablename__ = "item_stats"
+    __table_args__ = (
+        UniqueConstraint("ign", "item_name", "rarity", name="uq_item_stats_ign_item_rarity"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     ign = Column(String, index=True)
@@ -30,3 +33,36 @@ class ItemStat(Base):
     rarity = Column(String)  # Common, Uncommon, Rare, Epic, Legendary, Ultra
     count = Column(Integer, default=0)
     shiny_count = Column(Integer, default=0)
+
+class UserItemSummary(Base):
+    """Per-IGN item totals maintained alongside item_stats on every flush"""
+    __tablename__ = "user_item_summaries"
+
+    ign = Column(String, primary_key=True)
+    total_count = Column(Integer, default=0, nullable=False)
+    shiny_count = Column(Integer, default=0, nullable=False)
+    common_count = Column(Integer, default=0, nullable=False)
+    uncommon_count = Column(Integer, default=0, nullable=False)
+    rare_count = Column(Integer, default=0, nullable=False)
+    epic_count = Column(Integer, default=0, nullable=False)
+    legendary_count = Column(Integer, default=0, nullable=False)
+    ultra_count = Column(Integer, default=0, nullable=False)
+
+class StatsRollup(Base):
+    """Hourly CPU/memory averages and item pickups per IGN, written by StatsHistory"""
+    __tablename__ = "stats_rollups"
+
+    ign = Column(String, primary_key=True)
+    hour = Column(Integer, primary_key=True)  # Hours since the Unix epoch
+    samples = Column(Integer, default=0, nullable=False)
+    cpu_usage = Column(Float, nullable=True)
+    memory_usage = Column(BigInteger, nullable=True)
+    items = Column(Integer, default=0, nullable=False)
+
+class RuntimeState(Base):
+    """Small JSON values shared by every backend worker (server process, failed sessions)"""
+    __tablename__ = "runtime_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
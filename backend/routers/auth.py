@@ -1,27 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal, get_async_db
 from models.user import User
-from core.security import get_password_hash, verify_password, create_access_token
+from core.security import password_hasher, create_access_token
 from schemas.token import Token
 
 router = APIRouter(tags=["authentication"])
 
-def get_db():
+def store_rehashed_password(user_id: int, hashed_password: str):
+    """Persist a hash upgraded by passlib after the response has been sent"""
     db = SessionLocal()
     try:
-        yield db
+        db.query(User).filter(User.id == user_id).update({"hashed_password": hashed_password})
+        db.commit()
     finally:
         db.close()
 
+async def authenticate(db: AsyncSession, email: str, password: str, background_tasks: BackgroundTasks):
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
+        return None
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        background_tasks.add_task(store_rehashed_password, user.id, new_hash)
+    return user
+
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await authenticate(db, form_data.username, form_data.password, background_tasks)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -48,10 +63,11 @@ class RegisterRequest(BaseModel):
 @router.post("/login")
 async def login_user(
     request: LoginRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == request.email).first()
-    if not user or not verify_password(request.password, user.hashed_password):
+    user = await authenticate(db, request.email, request.password, background_tasks)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -63,7 +79,7 @@ async def login_user(
 @router.post("/register")
 async def register_user(
     request: RegisterRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     email = request.email
     password = request.password
@@ -71,21 +87,21 @@ async def register_user(
     store_password = request.store_password
     ms_credentials = request.ms_credentials
     # Check if user already exists
-    if db.query(User).filter(User.email == email).first():
+    if await db.scalar(select(User.id).where(User.email == email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Check if IGN already exists
-    if db.query(User).filter(User.ign == ign).first():
+    if await db.scalar(select(User.id).where(User.ign == ign)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="IGN already registered"
         )
 
     # Create new user
-    hashed_password = get_password_hash(password)
+    hashed_password = await password_hasher.hash(password)
     encrypted_ms = None
     if store_password and ms_credentials:
         from core.security import encrypt_data
@@ -101,7 +117,6 @@ async def register_user(
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     
     return {"message": "User created successfully"}
@@ -1,108 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from models.base import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models.user import User, Whitelist
-from services.docker_manager import DockerManager
-from core.security import get_current_user, is_admin
-from schemas.token import TokenData
-from schemas.minecraft import WhitelistAdd, WhitelistRemove
-import subprocess
-import os
-import time
+from services.docker_manager import AsyncDockerManager, get_async_docker_manager
+from services.container_index import ContainerIndex, get_container_index
+from services.log_stream import LogHub, get_log_hub
+from services.stats_collector import StatsCollector, get_stats_collector
+from services.item_tracker import ItemTracker, get_item_tracker
+from services.stats_history import StatsHistory, get_stats_history
+from services.log_archive import LogArchive, get_log_archive
+from services.whitelist import WhitelistCache, get_whitelist_cache
+from services.orchestrator import SessionOrchestrator, START, get_orchestrator
+from services.scheduler import CapacityError
+from services.supervisor import Supervisor, get_supervisor
+from services.server_process import ServerStateError, get_server
+from services.state import LockTimeout
+from core.config import settings
+from core.admission import LifecycleBusy
+from core.dependencies import (
+    Principal, get_current_active_user, get_current_admin, issue_stream_ticket, limit_lifecycle,
+    principal_of, redeem_stream_ticket, resolve_principal, spend_lifecycle_token
+)
+from schemas.minecraft import BulkSessions, WhitelistAdd, WhitelistRemove
+from datetime import datetime, timezone
+import asyncio
+import json
 
 router = APIRouter(prefix="/minecraft", tags=["minecraft"])
 
-# Track server status
-minecraft_server = {
-    "running": False,
-    "pid": None,
-    "start_time": None
-}
-
 @router.post("/start")
-async def start_server():
-    """Start the Minecraft server"""
-    if minecraft_server["running"]:
-        raise HTTPException(status_code=400, detail="Server is already running")
-    
+async def start_server(
+    current_user: Principal = Depends(get_current_admin),
+    server = Depends(get_server)
+):
+    """Start the Minecraft server (admin only)"""
     try:
-        # Start Minecraft server
-        process = subprocess.Popen(
-            ["java", "-Xmx1024M", "-Xms1024M", "-jar", "server.jar", "nogui"],
-            cwd="/minecraft",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        minecraft_server.update({
-            "running": True,
-            "pid": process.pid,
-            "start_time": time.time()
-        })
-        
-        return {"status": "started", "pid": process.pid}
+        return await server.start()
+    except ServerStateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/stop")
-async def stop_server():
-    """Stop the Minecraft server"""
-    if not minecraft_server["running"]:
-        raise HTTPException(status_code=400, detail="Server is not running")
-    
+async def stop_server(
+    current_user: Principal = Depends(get_current_admin),
+    server = Depends(get_server)
+):
+    """Stop the Minecraft server, letting it save the world first (admin only)"""
     try:
-        # Stop Minecraft server
-        os.kill(minecraft_server["pid"], 9)
-        minecraft_server.update({
-            "running": False,
-            "pid": None,
-            "start_time": None
-        })
-        return {"status": "stopped"}
+        return await server.stop()
+    except ServerStateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/server-stats")
-async def get_server_stats():
+async def get_server_stats(server = Depends(get_server)):
     """Get Minecraft server statistics"""
-    if not minecraft_server["running"]:
+    stats = await server.status()
+    if stats["status"] != "running":
         raise HTTPException(status_code=400, detail="Server is not running")
-    
-    uptime = time.time() - minecraft_server["start_time"]
-    return {
-        "status": "running",
-        "uptime": uptime,
-        "pid": minecraft_server["pid"]
-    }
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+    return stats
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@router.get("/server-logs")
+async def get_server_logs(
+    lines: int = Query(100, ge=1, le=settings.SERVER_OUTPUT_LINES),
+    current_user: Principal = Depends(get_current_admin),
+    server = Depends(get_server)
+):
+    """Latest Minecraft server output (admin only)"""
+    return {"lines": await server.recent(lines)}
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+NOT_RUNNING = {
+    "status": "not_running",
+    "logs": "",
+    "stats": None
+}
 
 @router.post("/start-afk")
 async def start_afk_session(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(limit_lifecycle),
+    db: AsyncSession = Depends(get_async_db),
+    docker_manager: AsyncDockerManager = Depends(get_async_docker_manager),
+    whitelist: WhitelistCache = Depends(get_whitelist_cache),
+    supervisor: Supervisor = Depends(get_supervisor)
 ):
-    current_user = get_current_user(token, db)
-    
     # Check if user is whitelisted
-    whitelist = db.query(Whitelist).filter(Whitelist.ign == current_user.ign).first()
-    if not whitelist or not whitelist.approved:
+    if not whitelist.loaded:
+        await asyncio.to_thread(whitelist.load)
+    if not whitelist.is_approved(current_user.ign):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Your account is not whitelisted"
         )
 
-    docker_manager = DockerManager()
     try:
-        container = docker_manager.start_minecraft_client(current_user, db)
+        user = await db.get(User, current_user.id)
+        await asyncio.to_thread(supervisor.reset, current_user.ign)
+        container = await docker_manager.start_minecraft_client(user)
         return {"status": "success", "container_id": container.id}
+    except CapacityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "60"}
+        )
+    except LifecycleBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except LockTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your session is already being started or stopped"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -111,66 +129,210 @@ async def start_afk_session(
 
 @router.post("/stop-afk")
 async def stop_afk_session(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    docker_manager: AsyncDockerManager = Depends(get_async_docker_manager),
+    index: ContainerIndex = Depends(get_container_index)
 ):
-    current_user = get_current_user(token, db)
-    docker_manager = DockerManager()
-    success = docker_manager.stop_minecraft_client(current_user.ign)
+    # Stopping nothing is free, so polling clients do not drain the start/stop budget
+    if index.get(current_user.ign) is None:
+        return {"status": "not_running"}
+    spend_lifecycle_token(current_user)
+    try:
+        success = await docker_manager.stop_minecraft_client(current_user.ign)
+    except LifecycleBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except LockTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your session is already being started or stopped"
+        )
     return {"status": "success" if success else "not_running"}
 
 @router.get("/status")
 async def get_afk_status(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    collector: StatsCollector = Depends(get_stats_collector),
+    supervisor: Supervisor = Depends(get_supervisor)
 ):
-    current_user = get_current_user(token, db)
-    docker_manager = DockerManager()
-    status = docker_manager.check_client_status(current_user.ign)
-    return status
+    snapshot = collector.snapshot(current_user.ign)
+    if snapshot is not None:
+        return snapshot
+    return await asyncio.to_thread(supervisor.failure, current_user.ign) or NOT_RUNNING
 
 @router.get("/stats")
 async def get_afk_stats(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    collector: StatsCollector = Depends(get_stats_collector),
+    item_tracker: ItemTracker = Depends(get_item_tracker)
 ):
-    current_user = get_current_user(token, db)
-    docker_manager = DockerManager()
-    status = docker_manager.check_client_status(current_user.ign)
+    status = collector.snapshot(current_user.ign) or NOT_RUNNING
+    items = await item_tracker.get_summary(current_user.ign, db)
     
     if not status['stats']:
         return {
-            "items_collected": 0,
-            "shiny_items": 0,
+            "items_collected": items["items_collected"],
+            "shiny_items": items["shiny_items"],
+            "rarities": items["rarities"],
             "session_time": 0,
             "cpu_usage": 0,
             "memory_usage": 0
         }
         
     return {
-        "items_collected": 0,  # TODO: Implement item tracking
-        "shiny_items": 0,      # TODO: Implement shiny tracking
+        "items_collected": items["items_collected"],
+        "shiny_items": items["shiny_items"],
+        "rarities": items["rarities"],
         "session_time": status['stats']['session_time'],
         "cpu_usage": status['stats']['cpu_usage'],
         "memory_usage": status['stats']['memory_usage']
     }
 
+@router.get("/stats/history")
+async def get_afk_stats_history(
+    range_name: str = Query("1h", alias="range", pattern="^(1h|6h|7d|30d)$"),
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    history: StatsHistory = Depends(get_stats_history)
+):
+    """CPU, memory and item pickups over time as parallel arrays, one entry per bucket"""
+    return await history.query(current_user.ign, range_name, db)
+
+@router.get("/logs")
+async def search_afk_logs(
+    since: datetime = Query(None, description="Only lines from this time on (the previous page's next_since)"),
+    skip: int = Query(0, ge=0, description="Matching lines at exactly since to skip (the previous page's next_skip)"),
+    grep: str = Query(None, max_length=200, description="Case-insensitive substring to match"),
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: Principal = Depends(get_current_active_user),
+    archive: LogArchive = Depends(get_log_archive)
+):
+    """Search the user's archived client logs"""
+    if not settings.LOG_ARCHIVE_DIR:
+        raise HTTPException(status_code=404, detail="Log archive is disabled")
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    lines = await asyncio.to_thread(archive.search, current_user.ign, since, grep, limit, skip)
+    next_since = next_skip = None
+    if len(lines) == limit:
+        # Resume after the lines already returned at the last timestamp, which may continue on the next page
+        next_since = lines[-1][0]
+        next_skip = sum(1 for stamp, _ in lines if stamp == next_since)
+        if since is not None and datetime.fromisoformat(next_since) == since:
+            next_skip += skip
+    return {
+        "lines": [{"timestamp": stamp, "line": line} for stamp, line in lines],
+        "next_since": next_since,
+        "next_skip": next_skip
+    }
+
+@router.post("/events/ticket")
+async def issue_events_ticket(current_user: Principal = Depends(get_current_active_user)):
+    """Single-use ticket for opening /events from an EventSource, which cannot send the bearer token"""
+    ticket = await asyncio.to_thread(issue_stream_ticket, current_user)
+    return {"ticket": ticket, "expires_in": settings.STREAM_TICKET_TTL}
+
+@router.get("/events")
+async def stream_afk_events(
+    request: Request,
+    token: str = Depends(optional_oauth2_scheme),
+    ticket: str = Query(None, description="From POST /events/ticket, for EventSource clients, which cannot set headers"),
+    db: AsyncSession = Depends(get_async_db),
+    collector: StatsCollector = Depends(get_stats_collector),
+    log_hub: LogHub = Depends(get_log_hub)
+):
+    """Server-Sent Events stream of AFK status changes, stats deltas and new log lines"""
+    unauthenticated = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if token:
+        current_user = await resolve_principal(token, db)
+    elif ticket:
+        user_id = await asyncio.to_thread(redeem_stream_ticket, ticket)
+        user = await db.get(User, user_id) if user_id is not None else None
+        if user is None:
+            raise unauthenticated
+        current_user = principal_of(user)
+    else:
+        raise unauthenticated
+    # The stream outlives the request; hand the connection back now, not when it ends
+    await db.close()
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    ign = current_user.ign
+    queue = log_hub.subscribe(ign)
+
+    async def event_stream():
+        try:
+            snapshot = collector.snapshot(ign) or NOT_RUNNING
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            log_hub.unsubscribe(ign, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/admin/sessions")
+async def bulk_sessions(
+    request_data: BulkSessions,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    whitelist: WhitelistCache = Depends(get_whitelist_cache),
+    orchestrator: SessionOrchestrator = Depends(get_orchestrator)
+):
+    """Start or stop AFK clients for many IGNs, streaming one NDJSON result per IGN (admin only)"""
+    igns = request_data.igns
+    if request_data.all_whitelisted:
+        if not whitelist.loaded:
+            await asyncio.to_thread(whitelist.load)
+        igns = whitelist.approved()
+    if not igns:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No IGNs given"
+        )
+
+    users = {}
+    if request_data.action == START:
+        if not whitelist.loaded:
+            await asyncio.to_thread(whitelist.load)
+        approved = [ign for ign in igns if whitelist.is_approved(ign)]
+        users = {user.ign: user for user in (await db.scalars(select(User).where(User.ign.in_(approved)))).all()}
+    # The loaded users stay usable detached; do not hold a connection for the whole batch
+    await db.close()
+
+    async def results():
+        async for result in orchestrator.run(request_data.action, igns, users):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @router.post("/whitelist/add")
 async def add_to_whitelist(
     whitelist_data: WhitelistAdd,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    whitelist: WhitelistCache = Depends(get_whitelist_cache)
 ):
     """Add a player to the whitelist (admin only)"""
-    current_user = get_current_user(token, db)
-    if not is_admin(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can manage whitelist"
-        )
-
     # Check if already whitelisted
-    existing = db.query(Whitelist).filter(Whitelist.ign == whitelist_data.ign).first()
+    existing = await db.scalar(select(Whitelist).where(Whitelist.ign == whitelist_data.ign))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -179,52 +341,47 @@ async def add_to_whitelist(
 
     new_entry = Whitelist(
         ign=whitelist_data.ign,
-        approved=True,
-        added_by=current_user.id
+        approved=True
     )
     db.add(new_entry)
-    db.commit()
+    await db.commit()
+    whitelist.set(whitelist_data.ign, True)
     
     return {"status": "success", "message": f"Added {whitelist_data.ign} to whitelist"}
 
 @router.post("/whitelist/remove")
 async def remove_from_whitelist(
     whitelist_data: WhitelistRemove,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    whitelist: WhitelistCache = Depends(get_whitelist_cache)
 ):
     """Remove a player from the whitelist (admin only)"""
-    current_user = get_current_user(token, db)
-    if not is_admin(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can manage whitelist"
-        )
-
-    entry = db.query(Whitelist).filter(Whitelist.ign == whitelist_data.ign).first()
+    entry = await db.scalar(select(Whitelist).where(Whitelist.ign == whitelist_data.ign))
     if not entry:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Player not found in whitelist"
         )
 
-    db.delete(entry)
-    db.commit()
+    await db.delete(entry)
+    await db.commit()
+    whitelist.remove(whitelist_data.ign)
     
     return {"status": "success", "message": f"Removed {whitelist_data.ign} from whitelist"}
 
 @router.get("/whitelist")
 async def get_whitelist(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    response: Response,
+    after: str = Query(None, description="Return entries after this IGN (the previous page's X-Next-After)"),
+    limit: int = Query(settings.WHITELIST_PAGE_SIZE, ge=1, le=10000),
+    current_user: Principal = Depends(get_current_admin),
+    whitelist: WhitelistCache = Depends(get_whitelist_cache)
 ):
-    """Get current whitelist (admin only)"""
-    current_user = get_current_user(token, db)
-    if not is_admin(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can view whitelist"
-        )
-
-    whitelist = db.query(Whitelist).all()
-    return [{"ign": w.ign, "approved": w.approved} for w in whitelist]
+    """Get current whitelist, one page ordered by IGN (admin only)"""
+    if not whitelist.loaded:
+        await asyncio.to_thread(whitelist.load)
+    page = whitelist.page(after=after, limit=limit)
+    if len(page) == limit:
+        response.headers["X-Next-After"] = page[-1]["ign"]
+    return page
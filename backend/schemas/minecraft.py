@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel
 
 class WhitelistAdd(BaseModel):
@@ -5,3 +6,8 @@ class WhitelistAdd(BaseModel):
 
 class WhitelistRemove(BaseModel):
     ign: str  # In-game name
+
+class BulkSessions(BaseModel):
+    action: Literal["start", "stop"]
+    igns: list[str] = []
+    all_whitelisted: bool = False  # Act on every approved IGN instead of igns
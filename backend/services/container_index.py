@@ -0,0 +1,207 @@
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+from services.docker_manager import CLIENT_PREFIX, default_host, docker_hosts, get_docker_manager, parse_docker_time
+from core import metrics
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# rename: a warm pool container claimed as mc-client-<ign>
+CLIENT_EVENTS = ["create", "start", "restart", "rename", "die", "oom", "destroy"]
+
+@dataclass(frozen=True)
+class ClientContainer:
+    ign: str
+    id: str
+    status: str
+    started_at: datetime = None
+    exit_code: int = None
+    oom_killed: bool = False
+    host: str = None
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+class ContainerIndex:
+    """In-memory IGN -> client container map kept current by the Docker events streams.
+
+    Built from a filtered container list of each Docker host, then updated
+    by one long-running events consumer per host. Only the leader consumes
+    events; followers apply the changes it relays (see ClusterRelay).
+    Listeners are called with (action, ClientContainer) for every change.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._loaded = set()  # hosts listed at least once
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stopping.set()  # Until start
+
+    def get(self, ign: str):
+        """Known container for an IGN, or None without asking the Docker daemon"""
+        return self._entries.get(ign)
+
+    @property
+    def loaded(self) -> bool:
+        """Whether every Docker host has been listed at least once"""
+        return self._loaded.issuperset(docker_hosts())
+
+    def running(self, host: str = None):
+        """All client containers currently running, optionally only on one host"""
+        return [
+            entry for entry in list(self._entries.values())
+            if entry.running and (host is None or entry.host == host)
+        ]
+
+    def exited(self, host: str = None):
+        """Client containers that have stopped but were not removed, optionally only on one host"""
+        return [
+            entry for entry in list(self._entries.values())
+            if entry.status == "exited" and (host is None or entry.host == host)
+        ]
+
+    def add_listener(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def load(self, host: str = None):
+        """Rebuild a host's part of the index from a single filtered container list"""
+        host = host or default_host()
+        entries = {}
+        for container in get_docker_manager(host).list_clients(all=True):
+            if not container.name.startswith(CLIENT_PREFIX):
+                continue
+            ign = container.name[len(CLIENT_PREFIX):]
+            state = container.attrs["State"]
+            entries[ign] = ClientContainer(
+                ign=ign,
+                id=container.id,
+                status=container.status,
+                started_at=parse_docker_time(state["StartedAt"]),
+                exit_code=state.get("ExitCode"),
+                oom_killed=state.get("OOMKilled", False),
+                host=host
+            )
+        with self._lock:
+            previous = {ign: entry for ign, entry in self._entries.items() if entry.host == host}
+            others = {ign: entry for ign, entry in self._entries.items() if entry.host != host}
+            self._entries = {**others, **entries}
+            self._loaded.add(host)
+        for ign, entry in entries.items():
+            if previous.get(ign) != entry:
+                self._notify("sync", entry)
+        for ign, entry in previous.items():
+            if ign not in entries:
+                self._notify("destroy", replace(entry, status="removed"))
+        logger.info(f"Indexed {len(entries)} client containers on {host}")
+
+    @property
+    def consuming(self) -> bool:
+        """Whether this worker follows the Docker events streams itself"""
+        return not self._stopping.is_set()
+
+    def start(self):
+        """Start one events consumer thread per Docker host, each loading its part of the index.
+
+        Does nothing if already consuming; may be called again after stop.
+        """
+        with self._lock:
+            if not self._stopping.is_set():
+                return
+            self._stopping = threading.Event()
+        for host in docker_hosts():
+            threading.Thread(
+                target=self._consume, args=(host, self._stopping), name=f"docker-events-{host}", daemon=True
+            ).start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def apply(self, event: dict, host: str = None):
+        """Apply one decoded Docker container event from a host to the index"""
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        name = attributes.get("name", "")
+        if not name.startswith(CLIENT_PREFIX):
+            return
+        ign = name[len(CLIENT_PREFIX):]
+        action = event.get("Action") or event.get("status")
+        container_id = event.get("Actor", {}).get("ID") or event.get("id")
+        timestamp = datetime.fromtimestamp(event.get("timeNano", 0) / 1e9, tz=timezone.utc)
+        with self._lock:
+            entry = self._entries.get(ign)
+            if entry is None or entry.id != container_id:
+                entry = ClientContainer(ign=ign, id=container_id, status="created", host=host)
+            if action in ("start", "restart", "rename"):
+                entry = replace(entry, status="running", started_at=timestamp,
+                                exit_code=None, oom_killed=False)
+            elif action == "die":
+                entry = replace(entry, status="exited", exit_code=int(attributes.get("exitCode", 0)))
+            elif action == "oom":
+                entry = replace(entry, oom_killed=True)
+            elif action == "destroy":
+                entry = replace(entry, status="removed")
+            if entry.status == "removed":
+                if self._entries.get(ign, entry).id == entry.id:
+                    self._entries.pop(ign, None)
+            else:
+                self._entries[ign] = entry
+        self._notify(action, entry)
+
+    def apply_relayed(self, action: str, entry: ClientContainer):
+        """Apply a change the leader saw on its events stream"""
+        with self._lock:
+            if entry.status == "removed":
+                if self._entries.get(entry.ign, entry).id == entry.id:
+                    self._entries.pop(entry.ign, None)
+            else:
+                self._entries[entry.ign] = entry
+        self._notify(action, entry)
+
+    def _notify(self, action: str, entry: ClientContainer):
+        for callback in list(self._listeners):
+            try:
+                callback(action, entry)
+            except Exception as e:
+                logger.error(f"Container index listener failed on {action} for {entry.ign}: {e}")
+
+    def _consume(self, host: str, stopping: threading.Event):
+        backoff = 1
+        while not stopping.is_set():
+            try:
+                # Subscribe before listing so no event between the two is missed
+                events = get_docker_manager(host).client_events(
+                    filters={"type": "container", "event": CLIENT_EVENTS}
+                )
+                self.load(host)
+                backoff = 1
+                for event in events:
+                    if stopping.is_set():
+                        return
+                    self.apply(event, host)
+            except (DockerException, RequestException) as e:
+                logger.warning(f"Docker events stream from {host} interrupted: {e}")
+            if not stopping.is_set():
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+_container_index = None
+
+def get_container_index() -> ContainerIndex:
+    """FastAPI dependency returning the process-wide ContainerIndex"""
+    global _container_index
+    if _container_index is None:
+        _container_index = ContainerIndex()
+        metrics.RUNNING_CLIENTS.set_function(lambda: len(_container_index.running()))
+    return _container_index
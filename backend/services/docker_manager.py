@@ -1,29 +1,224 @@
 import docker
 from docker.errors import DockerException
+from requests.exceptions import ConnectionError as DockerConnectionError
+from core.admission import SingleFlight
 from core.config import settings
+from core import metrics
 from models.user import User
-from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import asyncio
+import io
 import logging
+import shlex
+import tarfile
+import threading
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
+CLIENT_PREFIX = "mc-client-"
+LOCAL_HOST = "local"
+WARM_PREFIX = "mc-warm-"
+WARM_LABEL = "afk.pool"
+WARM_SESSION_FILE = "afk-session.env"
+LEGACY_DATA_PREFIX = "mc-data-"  # Per-IGN data volumes of older versions
+
+# Entrypoint of every client: point /data at the IGN's directory of the shared
+# data volume and exec the image's own entrypoint and command (passed as "$@"),
+# so warm and cold sessions of a user see the same data
+CLIENT_DATA_SCRIPT = (
+    'mkdir -p "/volumes/$MC_USERNAME"; rmdir /data 2>/dev/null; '
+    '[ -e /data ] || ln -s "/volumes/$MC_USERNAME" /data; '
+    'exec "$@"'
+)
+
+# Entrypoint of a warm container: idle until a session file is injected into
+# /tmp, load it, then continue as any other client
+WARM_WAIT_SCRIPT = (
+    f'while [ ! -f /tmp/{WARM_SESSION_FILE} ]; do sleep 0.1; done; '
+    f'set -a; . /tmp/{WARM_SESSION_FILE}; set +a; '
+    + CLIENT_DATA_SCRIPT
+)
+
+# Copies a legacy per-IGN volume (mounted at /legacy) into the shared layout,
+# unless the IGN already has data there
+MIGRATE_DATA_SCRIPT = (
+    '[ -e "/volumes/$MC_USERNAME" ] && exit 0; '
+    'mkdir -p "/volumes/$MC_USERNAME.tmp" && cp -a /legacy/. "/volumes/$MC_USERNAME.tmp/" '
+    '&& mv "/volumes/$MC_USERNAME.tmp" "/volumes/$MC_USERNAME"'
+)
+
+def client_data_volumes() -> dict:
+    """Shared data volume every client mounts; CLIENT_DATA_SCRIPT picks the IGN's directory"""
+    return {settings.CLIENT_DATA_VOLUME: {"bind": "/volumes", "mode": "rw"}}
+
+def session_archive(environment: dict) -> bytes:
+    """Tar holding the session env file injected into a warm container"""
+    content = "".join(f"{key}={shlex.quote(value)}\n" for key, value in environment.items()).encode()
+    info = tarfile.TarInfo(WARM_SESSION_FILE)
+    info.size = len(content)
+    info.mode = 0o600
+    info.mtime = int(time.time())
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+def parse_docker_time(value: str) -> datetime:
+    """Parse a Docker RFC 3339 timestamp (nanosecond precision is truncated)"""
+    return datetime.fromisoformat(value)
+
+def uptime_since(started_at: datetime) -> float:
+    """Seconds since a container's State.StartedAt"""
+    if started_at is None:
+        return 0
+    return max((datetime.now(timezone.utc) - started_at).total_seconds(), 0)
+
+def cpu_percent(stats: dict) -> float:
+    """CPU use between the sample and its precpu reading, as docker stats shows it (100% = one core)"""
+    cpu, precpu = stats['cpu_stats'], stats.get('precpu_stats', {})
+    cpu_delta = cpu['cpu_usage']['total_usage'] - precpu.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+    if cpu_delta < 0 or system_delta <= 0 or not precpu.get('system_cpu_usage'):
+        return 0.0
+    cpus = cpu.get('online_cpus') or len(cpu['cpu_usage'].get('percpu_usage') or []) or 1
+    return round(cpu_delta / system_delta * cpus * 100, 2)
+
+def memory_usage(stats: dict) -> int:
+    """Memory in use excluding page cache (cgroup v1 "cache", v2 "inactive_file")"""
+    memory = stats['memory_stats']
+    details = memory.get('stats', {})
+    cache = details.get('cache', details.get('inactive_file', 0))
+    return max(memory.get('usage', 0) - cache, 0)
+
+def summarize_client_stats(stats: dict) -> dict:
+    """Reduce a raw Docker stats sample to the resource fields the API exposes"""
+    return {
+        "cpu_usage": cpu_percent(stats),
+        "memory_usage": memory_usage(stats)
+    }
+
+def docker_hosts() -> dict:
+    """Configured Docker endpoints by name; the local daemon when none are set"""
+    return settings.DOCKER_HOSTS or {LOCAL_HOST: None}
+
+def default_host() -> str:
+    """Host for the server container and anything not placed by the scheduler"""
+    return next(iter(docker_hosts()))
+
+def client_restart_policy() -> dict:
+    """Let Docker restart clients only when the supervisor is not doing it"""
+    return {"Name": "no" if settings.SUPERVISOR_ENABLED else "unless-stopped"}
+
+def client_resources() -> dict:
+    """Per-client CPU/memory limits for containers.run, from Settings"""
+    resources = {}
+    if settings.CLIENT_MEM_LIMIT:
+        resources["mem_limit"] = settings.CLIENT_MEM_LIMIT
+    if settings.CLIENT_NANO_CPUS:
+        resources["nano_cpus"] = settings.CLIENT_NANO_CPUS
+    if settings.CLIENT_CPUSET_CPUS:
+        resources["cpuset_cpus"] = settings.CLIENT_CPUSET_CPUS
+    return resources
+
+def client_log_config() -> dict:
+    """Cap Docker's own json-file logs; the full history lives in the log archive"""
+    return {
+        "type": "json-file",
+        "config": {"max-size": settings.CLIENT_LOG_MAX_SIZE, "max-file": str(settings.CLIENT_LOG_MAX_FILES)}
+    }
+
 class DockerManager:
-    def __init__(self):
+    def __init__(self, host: str = LOCAL_HOST, base_url: str = None):
+        self.host = host
+        self.base_url = base_url
+        self.network_name = settings.DOCKER_NETWORK
+        self.mc_image = settings.DOCKER_MC_IMAGE
+        self.client = None
+        self._connect_lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """Open a pooled connection to the Docker daemon, replacing the current one only once it works"""
+        with self._connect_lock:
+            client = None
+            try:
+                if self.base_url:
+                    client = docker.DockerClient(
+                        base_url=self.base_url,
+                        max_pool_size=settings.DOCKER_MAX_POOL_SIZE,
+                        timeout=settings.DOCKER_TIMEOUT
+                    )
+                else:
+                    client = docker.from_env(
+                        max_pool_size=settings.DOCKER_MAX_POOL_SIZE,
+                        timeout=settings.DOCKER_TIMEOUT
+                    )
+                self._ensure_network_exists(client)
+            except Exception as e:
+                if client is not None:
+                    client.close()
+                logger.error(f"Failed to initialize Docker client for {self.host}: {e}")
+                raise
+            old_client, self.client = self.client, client
+        if old_client is not None:
+            old_client.close()
+
+    def close(self):
+        """Release the pooled Docker connections"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def ping(self) -> bool:
+        """Health check the daemon, reconnecting if it has gone away"""
         try:
-            self.client = docker.from_env()
-            self.network_name = settings.DOCKER_NETWORK
-            self.mc_image = settings.DOCKER_MC_IMAGE
-            self._ensure_network_exists()
-        except DockerException as e:
-            logger.error(f"Failed to initialize Docker client: {e}")
+            return self.client.ping()
+        except (DockerException, DockerConnectionError) as e:
+            logger.warning(f"Docker daemon unreachable, reconnecting: {e}")
+        try:
+            self.connect()
+            return True
+        except (DockerException, DockerConnectionError) as e:
+            logger.error(f"Docker reconnect failed: {e}")
+            return False
+
+    def info(self) -> dict:
+        """Daemon-wide facts, including MemTotal and NCPU"""
+        return self._call("info")
+
+    def _call(self, path: str, *args, **kwargs):
+        """Call client.<path> (e.g. "containers.get"), reconnecting once if the daemon restarted"""
+        def resolve():
+            target = self.client
+            for attr in path.split("."):
+                target = getattr(target, attr)
+            return target
+        start = time.perf_counter()
+        try:
+            try:
+                return resolve()(*args, **kwargs)
+            except DockerConnectionError as e:
+                logger.warning(f"Lost connection to Docker daemon, reconnecting: {e}")
+                try:
+                    self.connect()
+                except DockerConnectionError as reconnect_error:
+                    raise DockerException(f"Docker daemon unavailable: {reconnect_error}")
+                return resolve()(*args, **kwargs)
+        except Exception:
+            metrics.DOCKER_CALL_ERRORS.labels(operation=path).inc()
             raise
+        finally:
+            metrics.DOCKER_CALL_DURATION.labels(operation=path).observe(time.perf_counter() - start)
 
-    def _ensure_network_exists(self):
+    def _ensure_network_exists(self, client):
         """Ensure the Docker network exists"""
         try:
-            networks = self.client.networks.list(names=[self.network_name])
+            networks = client.networks.list(names=[self.network_name])
             if not networks:
-                self.client.networks.create(
+                client.networks.create(
                     self.network_name,
                     driver="bridge",
                     check_duplicate=True
@@ -32,81 +227,172 @@ class DockerManager:
             logger.error(f"Failed to ensure network exists: {e}")
             raise
 
-    def start_minecraft_client(self, user: User, db: Session):
-        """Start a Minecraft client container for the user"""
+    def client_environment(self, user: User) -> dict:
+        """Environment a client container needs to log in as the user"""
+        # Get decrypted Microsoft credentials
+        ms_password = ""
+        if user.store_password and user.encrypted_ms_credentials:
+            from core.security import decrypt_data
+            ms_password = decrypt_data(user.encrypted_ms_credentials)
+        return {
+            "MC_USERNAME": user.ign,
+            "MC_PASSWORD": ms_password,
+            "MC_SERVER": settings.MC_SERVER,
+            "MC_PORT": str(settings.MC_PORT),
+            "EULA": "TRUE"
+        }
+
+    def start_minecraft_client(self, user: User):
+        """Start a Minecraft client container for the user, claiming a warm one if available"""
+        began = time.monotonic()
+        if settings.WARM_POOL_SIZE > 0:
+            from services.warm_pool import get_warm_pool
+            container = get_warm_pool(self.host).claim(user)
+            if container is not None:
+                metrics.SESSION_READY_SECONDS.labels(path="warm").observe(time.monotonic() - began)
+                return container
         try:
-            # Get decrypted Microsoft credentials
-            ms_password = ""
-            if user.store_password and user.encrypted_ms_credentials:
-                from core.security import decrypt_data
-                ms_password = decrypt_data(user.encrypted_ms_credentials)
-                
-            container = self.client.containers.run(
+            container = self._call(
+                "containers.run",
                 image=self.mc_image,
-                name=f"mc-client-{user.ign}",
-                environment={
-                    "MC_USERNAME": user.ign,
-                    "MC_PASSWORD": ms_password,
-                    "MC_SERVER": settings.MC_SERVER,
-                    "MC_PORT": str(settings.MC_PORT),
-                    "EULA": "TRUE"
-                },
+                name=f"{CLIENT_PREFIX}{user.ign}",
+                entrypoint=["/bin/sh", "-c", CLIENT_DATA_SCRIPT, "client"],
+                command=self.image_command(),
+                environment=self.client_environment(user),
                 network=self.network_name,
                 detach=True,
-                restart_policy={"Name": "unless-stopped"},
-                volumes={
-                    f"mc-data-{user.ign}": {
-                        "bind": "/data",
-                        "mode": "rw"
-                    }
-                }
+                restart_policy=client_restart_policy(),
+                log_config=client_log_config(),
+                **client_resources(),
+                volumes=client_data_volumes()
             )
-            logger.info(f"Started Minecraft client for {user.ign}")
+            logger.info(f"Started Minecraft client for {user.ign} on {self.host}")
+            metrics.SESSION_READY_SECONDS.labels(path="cold").observe(time.monotonic() - began)
             return container
         except DockerException as e:
             logger.error(f"Failed to start Minecraft client for {user.ign}: {e}")
             raise RuntimeError(f"Failed to start Minecraft client: {e}")
 
+    def image_command(self) -> list:
+        """The client image's own entrypoint and command, run by the data and warm wrapper scripts"""
+        config = self._call("api.inspect_image", self.mc_image)["Config"]
+        return (config.get("Entrypoint") or []) + (config.get("Cmd") or [])
+
+    def create_warm_client(self) -> str:
+        """Run an idle client container that waits for a session; returns its id"""
+        container = self._call(
+            "containers.run",
+            image=self.mc_image,
+            name=f"{WARM_PREFIX}{uuid.uuid4().hex[:12]}",
+            entrypoint=["/bin/sh", "-c", WARM_WAIT_SCRIPT, "warm"],
+            command=self.image_command(),
+            labels={WARM_LABEL: "warm"},
+            network=self.network_name,
+            detach=True,
+            restart_policy=client_restart_policy(),
+            log_config=client_log_config(),
+            **client_resources(),
+            volumes=client_data_volumes()
+        )
+        return container.id
+
+    def migrate_legacy_volumes(self) -> int:
+        """Copy each per-IGN mc-data-<ign> volume into the shared data volume, then remove it.
+
+        IGNs that already have data in the shared volume keep it; a volume
+        still in use by a container is left for a later run. Returns the
+        number of volumes migrated.
+        """
+        migrated = 0
+        for volume in self._call("volumes.list", filters={"name": LEGACY_DATA_PREFIX}):
+            if not volume.name.startswith(LEGACY_DATA_PREFIX):
+                continue
+            ign = volume.name[len(LEGACY_DATA_PREFIX):]
+            try:
+                self._call(
+                    "containers.run",
+                    image=self.mc_image,
+                    entrypoint=["/bin/sh", "-c", MIGRATE_DATA_SCRIPT],
+                    environment={"MC_USERNAME": ign},
+                    volumes={
+                        **client_data_volumes(),
+                        volume.name: {"bind": "/legacy", "mode": "ro"}
+                    },
+                    remove=True
+                )
+                volume.remove()
+                migrated += 1
+                logger.info(f"Migrated {volume.name} on {self.host} into {settings.CLIENT_DATA_VOLUME}/{ign}")
+            except DockerException as e:
+                logger.warning(f"Failed to migrate {volume.name} on {self.host}: {e}")
+        return migrated
+
+    def list_warm_clients(self):
+        """Warm containers not yet claimed, running or not"""
+        containers = self._call(
+            "containers.list", all=True, filters={"label": f"{WARM_LABEL}=warm", "name": WARM_PREFIX}
+        )
+        return [container for container in containers if container.name.startswith(WARM_PREFIX)]
+
+    def bind_warm_client(self, container_id: str, user: User):
+        """Turn a warm container into the user's client: rename it, then inject the session.
+
+        Returns None, binding nothing, if the warm container is no longer running.
+        """
+        if not self._call("api.inspect_container", container_id)["State"].get("Running"):
+            return None
+        self._call("api.rename", container_id, f"{CLIENT_PREFIX}{user.ign}")
+        self._call("api.put_archive", container_id, "/tmp", session_archive(self.client_environment(user)))
+        logger.info(f"Started Minecraft client for {user.ign} on {self.host} from the warm pool")
+        return self._call("containers.get", container_id)
+
+    def remove_container(self, container_id: str):
+        """Force-remove a container by id, ignoring one that is already gone"""
+        try:
+            self._call("api.remove_container", container_id, force=True)
+        except DockerException as e:
+            logger.warning(f"Failed to remove container {container_id}: {e}")
+
+    def restart_client(self, container_id: str):
+        """Restart a client container in place, running or exited"""
+        self._call("api.restart", container_id, timeout=10)
+
     def stop_minecraft_client(self, ign: str):
         """Stop and remove a Minecraft client container"""
         try:
-            container = self.client.containers.get(f"mc-client-{ign}")
-            container.stop()
-            container.remove()
+            name = f"{CLIENT_PREFIX}{ign}"
+            self._call("api.stop", name)
+            self._call("api.remove_container", name)
             logger.info(f"Stopped Minecraft client for {ign}")
             return True
         except DockerException as e:
             logger.warning(f"Failed to stop Minecraft client for {ign}: {e}")
             return False
 
-    def check_client_status(self, ign: str):
-        """Check the status of a Minecraft client container"""
-        try:
-            container = self.client.containers.get(f"mc-client-{ign}")
-            stats = container.stats(stream=False)
-            return {
-                "status": container.status,
-                "logs": container.logs(tail=10).decode('utf-8'),
-                "stats": {
-                    "cpu_usage": stats['cpu_stats']['cpu_usage']['total_usage'],
-                    "memory_usage": stats['memory_stats']['usage'],
-                    "session_time": (
-                        stats['read'] - stats['precpu_stats']['system_cpu_usage']
-                    ) / 1e9  # Convert nanoseconds to seconds
-                }
-            }
-        except DockerException as e:
-            logger.debug(f"Container for {ign} not found: {e}")
-            return {
-                "status": "not_running",
-                "logs": "",
-                "stats": None
-            }
+    def list_clients(self, all: bool = False):
+        """List Minecraft client containers (running only unless all=True)"""
+        return self._call("containers.list", all=all, filters={"name": CLIENT_PREFIX})
+
+    def client_events(self, **kwargs):
+        """Blocking generator of decoded container lifecycle events"""
+        return self._call("api.events", decode=True, **kwargs)
+
+    def client_stats_stream(self, container_id: str):
+        """Blocking generator of decoded stats samples for a container"""
+        return self._call("api.stats", container_id, stream=True, decode=True)
+
+    def client_log_stream(self, container_id: str, tail: int = 10, since: datetime = None):
+        """Blocking generator following a container's timestamped output"""
+        return self._call(
+            "api.logs", container_id,
+            stream=True, follow=True, timestamps=True, tail=tail, since=since
+        )
 
     def start_minecraft_server(self):
         """Start the Minecraft server container"""
         try:
-            container = self.client.containers.run(
+            container = self._call(
+                "containers.run",
                 image=self.mc_image,
                 name="mc-server",
                 environment={
@@ -131,10 +417,10 @@ class DockerManager:
             raise RuntimeError(f"Failed to start Minecraft server: {e}")
 
     def stop_minecraft_server(self):
-        """Stop the Minecraft server container"""
+        """Stop the Minecraft server container, giving it SERVER_STOP_TIMEOUT to save the world"""
         try:
-            container = self.client.containers.get("mc-server")
-            container.stop()
+            container = self._call("containers.get", "mc-server")
+            container.stop(timeout=settings.SERVER_STOP_TIMEOUT)
             container.remove()
             logger.info("Stopped Minecraft server")
             return True
@@ -142,16 +428,22 @@ class DockerManager:
             logger.warning(f"Failed to stop Minecraft server: {e}")
             return False
 
+    def server_logs(self, tail: int = 100) -> list:
+        """Latest output lines of the Minecraft server container"""
+        try:
+            output = self._call("api.logs", "mc-server", tail=tail)
+        except DockerException:
+            return []
+        return output.decode("utf-8", errors="replace").splitlines()
+
     def get_server_status(self):
         """Get the status of the Minecraft server container"""
         try:
-            container = self.client.containers.get("mc-server")
-            stats = container.stats(stream=False)
+            container = self._call("containers.get", "mc-server")
+            started_at = parse_docker_time(container.attrs["State"]["StartedAt"])
             return {
                 "status": container.status,
-                "uptime": (
-                    stats['read'] - stats['precpu_stats']['system_cpu_usage']
-                ) / 1e9,  # Convert nanoseconds to seconds
+                "uptime": uptime_since(started_at) if container.status == "running" else 0,
                 "pid": container.id
             }
         except DockerException as e:
@@ -161,3 +453,105 @@ class DockerManager:
                 "uptime": 0,
                 "pid": None
             }
+
+
+_docker_managers = {}
+_docker_manager_lock = threading.Lock()
+
+def get_docker_manager(host: str = None) -> DockerManager:
+    """Return the process-wide DockerManager for a host (the default host if None), creating it on first use"""
+    host = host or default_host()
+    manager = _docker_managers.get(host)
+    if manager is None:
+        with _docker_manager_lock:
+            manager = _docker_managers.get(host)
+            if manager is None:
+                manager = DockerManager(host, docker_hosts().get(host))
+                _docker_managers[host] = manager
+    return manager
+
+def close_docker_manager():
+    """Close the DockerManagers of every host"""
+    with _docker_manager_lock:
+        for manager in _docker_managers.values():
+            manager.close()
+        _docker_managers.clear()
+
+
+class AsyncDockerManager:
+    """Awaitable facade running DockerManager calls on bounded thread pools.
+
+    Lifecycle calls (run/stop/remove) and inspection calls (status/stats)
+    get separate pools so a container waiting out its stop grace period
+    cannot starve status polling. A client start/stop holds its lifecycle
+    thread while it waits for a slot and the IGN lock, so the pool has a
+    thread for every slot plus DOCKER_LIFECYCLE_WORKERS more; otherwise
+    starts blocked on one IGN's lock would keep the others from reaching
+    LIFECYCLE_MAX_CONCURRENCY.
+    """
+
+    def __init__(self):
+        self._lifecycle = ThreadPoolExecutor(
+            max_workers=settings.LIFECYCLE_MAX_CONCURRENCY + settings.DOCKER_LIFECYCLE_WORKERS,
+            thread_name_prefix="docker-lifecycle"
+        )
+        self._inspect = ThreadPoolExecutor(
+            max_workers=settings.DOCKER_INSPECT_WORKERS,
+            thread_name_prefix="docker-inspect"
+        )
+        self._in_flight = SingleFlight()
+
+    async def _run(self, executor, method: str, *args):
+        def call():
+            return getattr(get_docker_manager(), method)(*args)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+    async def _schedule(self, method: str, *args):
+        def call():
+            from services.scheduler import get_scheduler
+            return getattr(get_scheduler(), method)(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._lifecycle, call)
+
+    async def ping(self) -> bool:
+        return await self._run(self._inspect, "ping")
+
+    async def start_minecraft_client(self, user: User):
+        """Start the user's client; concurrent calls for the same IGN share one start"""
+        return await self._in_flight.do("start", user.ign, lambda: self._schedule("start_client", user))
+
+    async def stop_minecraft_client(self, ign: str):
+        """Stop an IGN's client; concurrent calls share one stop"""
+        return await self._in_flight.do("stop", ign, lambda: self._schedule("stop_client", ign))
+
+    async def start_minecraft_server(self):
+        return await self._run(self._lifecycle, "start_minecraft_server")
+
+    async def stop_minecraft_server(self):
+        return await self._run(self._lifecycle, "stop_minecraft_server")
+
+    async def get_server_status(self):
+        return await self._run(self._inspect, "get_server_status")
+
+    async def server_logs(self, tail: int = 100) -> list:
+        return await self._run(self._inspect, "server_logs", tail)
+
+    def shutdown(self):
+        self._lifecycle.shutdown(wait=False, cancel_futures=True)
+        self._inspect.shutdown(wait=False, cancel_futures=True)
+
+_async_docker_manager = None
+
+def get_async_docker_manager() -> AsyncDockerManager:
+    """FastAPI dependency returning the process-wide AsyncDockerManager"""
+    global _async_docker_manager
+    if _async_docker_manager is None:
+        _async_docker_manager = AsyncDockerManager()
+    return _async_docker_manager
+
+def close_async_docker_manager():
+    """Shut down the executors and the underlying DockerManager"""
+    global _async_docker_manager
+    if _async_docker_manager is not None:
+        _async_docker_manager.shutdown()
+        _async_docker_manager = None
+    close_docker_manager()
@@ -0,0 +1,256 @@
+from sqlalchemy import case, delete, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.cache import TTLCache
+from core.config import settings
+from core import metrics
+from database import SessionLocal, get_engine
+from models.user import ItemStat, UserItemSummary
+import asyncio
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+RARITIES = ["Common", "Uncommon", "Rare", "Epic", "Legendary", "Ultra"]
+
+def rarity_column(rarity: str) -> str:
+    """UserItemSummary column holding the count for a rarity"""
+    return f"{rarity.lower()}_count"
+
+SUMMARY_COLUMNS = ["total_count", "shiny_count"] + [rarity_column(rarity) for rarity in RARITIES]
+
+# Rows per INSERT statement, well under Postgres' 65535 bind parameter limit
+UPSERT_BATCH_ROWS = 1000
+
+ITEM_STATS_KEY = ["ign", "item_name", "rarity"]
+
+# Run by db_init: create_all never alters an existing item_stats table, so merge
+# duplicate rows (older deployments inserted one per flush) and add the unique key
+# the flush upserts on. Safe to run repeatedly.
+ITEM_STATS_UNIQUE_SQL = """
+WITH merged AS (
+    SELECT MIN(id) AS keep_id, ign, item_name, rarity,
+           SUM(COALESCE(count, 0)) AS count, SUM(COALESCE(shiny_count, 0)) AS shiny_count
+    FROM item_stats GROUP BY ign, item_name, rarity HAVING COUNT(*) > 1
+), kept AS (
+    UPDATE item_stats SET count = merged.count, shiny_count = merged.shiny_count
+    FROM merged WHERE item_stats.id = merged.keep_id
+)
+DELETE FROM item_stats USING merged
+WHERE item_stats.ign IS NOT DISTINCT FROM merged.ign
+  AND item_stats.item_name IS NOT DISTINCT FROM merged.item_name
+  AND item_stats.rarity IS NOT DISTINCT FROM merged.rarity
+  AND item_stats.id <> merged.keep_id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_item_stats_ign_item_rarity ON item_stats (ign, item_name, rarity);
+"""
+
+def migrate_item_stats():
+    """Deduplicate item_stats and add its (ign, item_name, rarity) unique key"""
+    with get_engine().begin() as connection:
+        connection.execute(text(ITEM_STATS_UNIQUE_SQL))
+
+def has_item_stats_key() -> bool:
+    """Whether item_stats has the unique key the flush upserts on"""
+    db = SessionLocal()
+    try:
+        inspector = inspect(db.get_bind())
+        keys = [constraint["column_names"] for constraint in inspector.get_unique_constraints("item_stats")]
+        keys += [index["column_names"] for index in inspector.get_indexes("item_stats") if index["unique"]]
+    finally:
+        db.close()
+    return any(sorted(key) == sorted(ITEM_STATS_KEY) for key in keys)
+
+# Player chat ("<Name> ...") must never count as a pickup
+CHAT_MESSAGE = re.compile(r"<\w{1,16}>")
+
+class ItemTracker:
+    """Parses item pickups out of client log lines and flushes them to item_stats in batches.
+
+    Lines are matched against precompiled patterns on the log reader threads
+    and folded into an in-memory (ign, item_name, rarity) -> [count, shiny]
+    map. A periodic flush turns the map into multi-row upserts of item_stats
+    and of the per-IGN user_item_summaries rollup, so database writes scale
+    with distinct items per interval, not log volume, and reading a user's
+    totals is a single primary-key lookup.
+    """
+
+    def __init__(self):
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in settings.ITEM_PICKUP_PATTERNS]
+        self._rarities = {rarity.lower(): rarity for rarity in RARITIES}
+        self._pending = {}
+        self._listeners = []
+        self.persisting = True  # Off in followers, which only feed listeners
+        self._lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self.summaries = TTLCache(
+            maxsize=settings.ITEM_SUMMARY_CACHE_MAX_ENTRIES,
+            ttl=settings.ITEM_SUMMARY_CACHE_TTL
+        )
+        metrics.register_cache("item_summaries", self.summaries)
+
+    def parse(self, line: str):
+        """Return (item_name, rarity, count, shiny) for a pickup line, else None"""
+        if CHAT_MESSAGE.search(line):
+            return None
+        for pattern in self.patterns:
+            match = pattern.search(line)
+            if match is None:
+                continue
+            fields = match.groupdict()
+            item_name = (fields.get("item") or "").strip()
+            if not item_name:
+                continue
+            rarity = self._rarities.get((fields.get("rarity") or "").lower(), "Common")
+            count = int(fields.get("count") or fields.get("count_suffix") or 1)
+            return item_name, rarity, count, bool(fields.get("shiny"))
+        return None
+
+    def add_listener(self, callback):
+        """Call callback(ign, count) for every parsed pickup"""
+        self._listeners.append(callback)
+
+    def handle_line(self, ign: str, line: str, timestamp=None):
+        """LogHub sink: aggregate a pickup if the line contains one"""
+        pickup = self.parse(line)
+        if pickup is None:
+            return
+        item_name, rarity, count, shiny = pickup
+        for callback in self._listeners:
+            callback(ign, count)
+        if not self.persisting:
+            return
+        with self._lock:
+            totals = self._pending.setdefault((ign, item_name, rarity), [0, 0])
+            totals[0] += count
+            if shiny:
+                totals[1] += count
+            if len(self._pending) >= settings.ITEM_PENDING_MAX_KEYS:
+                self._flush_requested.set()
+
+    def flush(self) -> int:
+        """Write all pending totals in one upsert; returns the number of rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_requested.clear()
+        if not pending:
+            return 0
+        rows = []
+        summaries = {}
+        for (ign, item_name, rarity), (count, shiny) in pending.items():
+            rows.append({
+                "ign": ign, "item_name": item_name, "rarity": rarity,
+                "count": count, "shiny_count": shiny
+            })
+            summary = summaries.setdefault(ign, dict.fromkeys(SUMMARY_COLUMNS, 0))
+            summary["total_count"] += count
+            summary["shiny_count"] += shiny
+            summary[rarity_column(rarity)] += count
+        db = SessionLocal()
+        try:
+            self._upsert(db, ItemStat, rows, ITEM_STATS_KEY, ["count", "shiny_count"])
+            self._upsert(
+                db, UserItemSummary,
+                [{"ign": ign, **totals} for ign, totals in summaries.items()],
+                ["ign"], SUMMARY_COLUMNS
+            )
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Failed to flush {len(rows)} item stats: {e}")
+            self._requeue(pending)
+            return 0
+        finally:
+            db.close()
+        for ign in summaries:
+            self.summaries.pop(ign)
+        return len(rows)
+
+    @staticmethod
+    def _upsert(db: Session, model, rows: list, keys: list, increments: list):
+        """Insert rows, adding the increment columns onto any existing row"""
+        for start in range(0, len(rows), UPSERT_BATCH_ROWS):
+            statement = insert(model).values(rows[start:start + UPSERT_BATCH_ROWS])
+            statement = statement.on_conflict_do_update(
+                index_elements=keys,
+                set_={
+                    column: getattr(model, column) + statement.excluded[column]
+                    for column in increments
+                }
+            )
+            db.execute(statement)
+
+    async def get_summary(self, ign: str, db: AsyncSession) -> dict:
+        """Item totals and rarity breakdown for an IGN, cached until the next flush touches it"""
+        summary = self.summaries.get(ign)
+        if summary is not None:
+            return summary
+        row = await db.get(UserItemSummary, ign)
+        summary = {
+            "items_collected": row.total_count if row else 0,
+            "shiny_items": row.shiny_count if row else 0,
+            "rarities": {
+                rarity: getattr(row, rarity_column(rarity)) if row else 0
+                for rarity in RARITIES
+            }
+        }
+        self.summaries.set(ign, summary)
+        return summary
+
+    def _requeue(self, pending: dict):
+        """Merge unflushed totals back, dropping them if that would exceed the bound"""
+        with self._lock:
+            if len(self._pending) + len(pending) > settings.ITEM_PENDING_MAX_KEYS * 2:
+                logger.warning(f"Dropping {len(pending)} unflushed item stats")
+                return
+            for key, (count, shiny) in pending.items():
+                totals = self._pending.setdefault(key, [0, 0])
+                totals[0] += count
+                totals[1] += shiny
+
+    async def run(self):
+        """Flush every ITEM_FLUSH_INTERVAL seconds, or sooner when the buffer fills.
+
+        Refuses to run if item_stats lacks its unique key, since every flush
+        would fail; run db_init to migrate the table.
+        """
+        if not await asyncio.to_thread(has_item_stats_key):
+            logger.error("item_stats has no (ign, item_name, rarity) unique key, not persisting item stats; run db_init")
+            self.persisting = False
+            return
+        while True:
+            await asyncio.to_thread(self._flush_requested.wait, settings.ITEM_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Item stats flush failed: {e}")
+
+def rebuild_item_summaries(db: Session):
+    """Recompute user_item_summaries from item_stats (e.g. after a manual backfill)"""
+    db.execute(delete(UserItemSummary))
+    totals = [
+        func.sum(ItemStat.count),
+        func.sum(ItemStat.shiny_count)
+    ] + [
+        func.sum(case((ItemStat.rarity == rarity, ItemStat.count), else_=0))
+        for rarity in RARITIES
+    ]
+    db.execute(
+        insert(UserItemSummary).from_select(
+            ["ign"] + SUMMARY_COLUMNS,
+            select(ItemStat.ign, *totals).group_by(ItemStat.ign)
+        )
+    )
+    db.commit()
+
+_item_tracker = None
+
+def get_item_tracker() -> ItemTracker:
+    """Return the process-wide ItemTracker"""
+    global _item_tracker
+    if _item_tracker is None:
+        _item_tracker = ItemTracker()
+    return _item_tracker
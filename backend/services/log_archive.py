@@ -0,0 +1,258 @@
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from core.config import settings
+import asyncio
+import gzip
+import logging
+import os
+import re
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Index record per gzip member: first and last line timestamp (epoch seconds), member offset
+INDEX_RECORD = struct.Struct("<ddQ")
+SEGMENT_SUFFIX = ".log.gz"
+INDEX_SUFFIX = ".idx"
+SAFE_IGN = re.compile(r"^\w{1,32}$")
+
+class ClientLog:
+    """Archive of one IGN: buffered lines plus the segment currently written to"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.pending = []  # (epoch seconds, encoded "timestamp line\n") not yet compressed
+        self.pending_bytes = 0
+        self.segment = None  # path of the open segment, without suffix
+        self.segment_started = 0.0
+
+class LogArchive:
+    """Writes every client's log lines to rotated, gzip-compressed segments.
+
+    A LogHub sink buffers lines per IGN; each flush compresses the buffer
+    as one gzip member appended to the IGN's current segment and appends a
+    fixed-size (first, last, offset) record to the segment's .idx file.
+    A multi-member gzip file is still a valid gzip file, and the index lets
+    a search seek straight to the first member at or after `since` and
+    decompress only from there. Segments rotate at LOG_ARCHIVE_SEGMENT_BYTES
+    or LOG_ARCHIVE_SEGMENT_SECONDS and are deleted after
+    LOG_ARCHIVE_RETENTION_DAYS, checked whenever an IGN opens a new segment
+    and by a periodic sweep over every IGN's directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._logs = {}  # ign -> ClientLog
+        self._lock = threading.Lock()
+
+    def _get(self, ign: str) -> ClientLog:
+        with self._lock:
+            log = self._logs.get(ign)
+            if log is None:
+                directory = os.path.join(self.root, ign)
+                os.makedirs(directory, exist_ok=True)
+                log = self._logs[ign] = ClientLog(directory)
+            return log
+
+    def handle_line(self, ign: str, line: str, timestamp: datetime = None):
+        """LogHub sink: buffer a line, compressing a block once enough has built up"""
+        if not SAFE_IGN.match(ign):
+            return
+        timestamp = timestamp or datetime.now(timezone.utc)
+        log = self._get(ign)
+        record = f"{timestamp.isoformat()} {line}\n".encode()
+        with log.lock:
+            log.pending.append((timestamp.timestamp(), record))
+            log.pending_bytes += len(record)
+            if log.pending_bytes >= settings.LOG_ARCHIVE_BLOCK_BYTES:
+                self._write_block(log)
+
+    def _write_block(self, log: ClientLog):
+        """Compress pending lines as one gzip member; caller holds log.lock"""
+        if not log.pending:
+            return
+        first, last = log.pending[0][0], log.pending[-1][0]
+        path = self._segment_for(log, first)
+        data = gzip.compress(b"".join(record for _, record in log.pending), compresslevel=6)
+        try:
+            with open(path + SEGMENT_SUFFIX, "ab") as segment:
+                offset = segment.tell()
+                segment.write(data)
+            with open(path + INDEX_SUFFIX, "ab") as index:
+                index.write(INDEX_RECORD.pack(first, last, offset))
+        except OSError as e:
+            logger.error(f"Failed to archive {len(log.pending)} log lines to {path}: {e}")
+        log.pending.clear()
+        log.pending_bytes = 0
+
+    def _segment_for(self, log: ClientLog, first: float) -> str:
+        """Current segment path, opening a new one (and pruning old ones) when there is none or it is full or old"""
+        if log.segment is not None:
+            try:
+                size = os.path.getsize(log.segment + SEGMENT_SUFFIX)
+            except OSError:
+                size = 0
+            if (size < settings.LOG_ARCHIVE_SEGMENT_BYTES
+                    and time.time() - log.segment_started < settings.LOG_ARCHIVE_SEGMENT_SECONDS):
+                return log.segment
+        self._prune(log.directory)
+        log.segment = os.path.join(log.directory, f"{int(first * 1000):013d}")
+        log.segment_started = time.time()
+        return log.segment
+
+    @staticmethod
+    def _segments(directory: str) -> list:
+        """Segment paths without suffix, oldest first"""
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            os.path.join(directory, name[:-len(SEGMENT_SUFFIX)])
+            for name in names if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _prune(self, directory: str) -> int:
+        """Delete a directory's segments older than the retention; returns how many"""
+        cutoff = (time.time() - settings.LOG_ARCHIVE_RETENTION_DAYS * 86400) * 1000
+        removed = 0
+        for path in self._segments(directory):
+            if int(os.path.basename(path)) >= cutoff:
+                break
+            for suffix in (SEGMENT_SUFFIX, INDEX_SUFFIX):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        return removed
+
+    def prune(self) -> int:
+        """Apply the retention to every IGN, including ones that no longer log; returns segments deleted"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            directory = os.path.join(self.root, name)
+            if not SAFE_IGN.match(name) or not os.path.isdir(directory):
+                continue
+            log = self._logs.get(name)
+            with log.lock if log is not None else nullcontext():
+                removed += self._prune(directory)
+        return removed
+
+    def flush(self) -> int:
+        """Compress every IGN's pending lines; returns the number of lines written"""
+        written = 0
+        for log in list(self._logs.values()):
+            with log.lock:
+                written += len(log.pending)
+                self._write_block(log)
+        return written
+
+    def search(self, ign: str, since: datetime = None, grep: str = None, limit: int = 500, skip: int = 0) -> list:
+        """Up to limit (timestamp, line) pairs containing grep (case-insensitive), oldest first.
+
+        Lines start at since, minus the first skip matches logged at exactly
+        since, so a page can resume inside a run of lines sharing a timestamp.
+        """
+        if not SAFE_IGN.match(ign):
+            return []
+        since_epoch = since.timestamp() if since else 0.0
+        needle = grep.lower() if grep else None
+        results = []
+        skipped = 0
+
+        def collect(epoch: float, record: bytes) -> bool:
+            nonlocal skipped
+            if epoch < since_epoch:
+                return True
+            text = record.decode("utf-8", errors="replace").rstrip("\n")
+            stamp, _, line = text.partition(" ")
+            if needle is None or needle in line.lower():
+                if epoch == since_epoch and skipped < skip:
+                    skipped += 1
+                    return True
+                results.append((stamp, line))
+            return len(results) < limit
+
+        for path in self._segments(os.path.join(self.root, ign)):
+            offset = self._seek(path, since_epoch)
+            if offset is None:
+                continue
+            if not self._scan(path, offset, collect):
+                return results
+        log = self._logs.get(ign)
+        if log is not None:
+            with log.lock:
+                pending = list(log.pending)
+            for epoch, record in pending:
+                if not collect(epoch, record):
+                    break
+        return results
+
+    @staticmethod
+    def _seek(path: str, since_epoch: float):
+        """Offset of the first member holding lines at or after since_epoch, or None if none does"""
+        try:
+            with open(path + INDEX_SUFFIX, "rb") as index:
+                data = index.read()
+        except FileNotFoundError:
+            return None
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        for first, last, offset in INDEX_RECORD.iter_unpack(data[:usable]):
+            if last >= since_epoch:
+                return offset
+        return None
+
+    @staticmethod
+    def _scan(path: str, offset: int, collect) -> bool:
+        """Feed lines from offset on to collect(epoch, record) until it returns False"""
+        try:
+            with open(path + SEGMENT_SUFFIX, "rb") as segment:
+                segment.seek(offset)
+                with gzip.GzipFile(fileobj=segment) as lines:
+                    for record in lines:
+                        stamp = record[:record.find(b" ")].decode()
+                        try:
+                            epoch = datetime.fromisoformat(stamp).timestamp()
+                        except ValueError:
+                            continue
+                        if not collect(epoch, record):
+                            return False
+        except (OSError, EOFError) as e:
+            logger.warning(f"Failed to read log segment {path}: {e}")
+        return True
+
+    async def run(self):
+        """Compress buffered lines every LOG_ARCHIVE_FLUSH_INTERVAL seconds, prune every LOG_ARCHIVE_PRUNE_INTERVAL"""
+        next_prune = 0.0
+        while True:
+            await asyncio.sleep(settings.LOG_ARCHIVE_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Log archive flush failed: {e}")
+            if time.monotonic() < next_prune:
+                continue
+            next_prune = time.monotonic() + settings.LOG_ARCHIVE_PRUNE_INTERVAL
+            try:
+                removed = await asyncio.to_thread(self.prune)
+                if removed:
+                    logger.info(f"Pruned {removed} expired log segments")
+            except Exception as e:
+                logger.error(f"Log archive prune failed: {e}")
+
+_log_archive = None
+
+def get_log_archive() -> LogArchive:
+    """FastAPI dependency returning the process-wide LogArchive"""
+    global _log_archive
+    if _log_archive is None:
+        _log_archive = LogArchive(settings.LOG_ARCHIVE_DIR)
+    return _log_archive
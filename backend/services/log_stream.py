@@ -0,0 +1,206 @@
+from collections import deque
+from datetime import datetime, timezone
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+from core.config import settings
+from services.container_index import ClientContainer, ContainerIndex, get_container_index
+from services.docker_manager import get_docker_manager, parse_docker_time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class LogHub:
+    """Fans out one follow-mode log reader per client container.
+
+    While following (on the leader), every running container gets exactly
+    one upstream logs(stream=True, follow=True) reader; followers receive
+    the lines through inject instead. Lines go into a small per-IGN ring
+    buffer, to sinks registered with add_sink (called on the reader
+    thread), and to any number of asyncio subscribers, which also receive
+    status and stats events published for that IGN.
+    """
+
+    def __init__(self, index: ContainerIndex):
+        self.index = index
+        self._readers = {}  # container id -> reader thread
+        self._recent = {}  # ign -> deque of recent lines
+        self._last_seen = {}  # container id -> timestamp of the last line read
+        self._sinks = []
+        self._subscribers = {}  # ign -> set of (loop, queue)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stopping.set()  # Until start_following
+        index.add_listener(self._on_container_event)
+
+    def add_sink(self, callback):
+        """Register callback(ign, line, timestamp) for every new log line of every client"""
+        with self._lock:
+            self._sinks.append(callback)
+
+    def remove_sink(self, callback):
+        with self._lock:
+            if callback in self._sinks:
+                self._sinks.remove(callback)
+
+    def recent(self, ign: str, lines: int = 10) -> list:
+        buffer = self._recent.get(ign)
+        if not buffer:
+            return []
+        return list(buffer)[-lines:]
+
+    def last_seen(self, container_id: str):
+        """Timestamp of the newest live line read from a container, if any"""
+        return self._last_seen.get(container_id)
+
+    def cursors(self) -> dict:
+        """Container id -> ISO timestamp of the newest line passed to the sinks, for running containers"""
+        running = {entry.id for entry in self.index.running()}
+        return {
+            container_id: timestamp.isoformat()
+            for container_id, timestamp in list(self._last_seen.items())
+            if container_id in running
+        }
+
+    def start_following(self, cursors: dict = None):
+        """Start a reader for every running container, and for each one that starts later.
+
+        A container with a cursor (see cursors) is read from there, so its
+        lines since reach the sinks; the others start with their backlog
+        shown but not sunk. Does nothing if already following.
+        """
+        with self._lock:
+            if not self._stopping.is_set():
+                return
+            self._stopping = threading.Event()
+            for container_id, stamp in (cursors or {}).items():
+                cursor = parse_docker_time(stamp)
+                if container_id not in self._last_seen or self._last_seen[container_id] < cursor:
+                    self._last_seen[container_id] = cursor
+        for entry in self.index.running():
+            self.follow(entry)
+
+    def stop_following(self):
+        """Stop every reader; lines after this reach the hub only through inject"""
+        self._stopping.set()
+
+    def inject(self, ign: str, line: str, timestamp: datetime):
+        """Handle a line read by another worker as if it came from a reader here"""
+        self._dispatch(ign, self._recent.setdefault(ign, deque(maxlen=settings.LOG_BUFFER_LINES)), line, timestamp)
+
+    def has_subscribers(self, ign: str) -> bool:
+        return bool(self._subscribers.get(ign))
+
+    def subscribe(self, ign: str) -> asyncio.Queue:
+        """Queue receiving log/status/stats events for an IGN on the running loop"""
+        queue = asyncio.Queue(maxsize=settings.LOG_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(ign, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, ign: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(ign, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(ign, None)
+
+    def publish(self, ign: str, event: dict):
+        """Push an event to the subscribers of an IGN; safe to call from any thread"""
+        for loop, queue in list(self._subscribers.get(ign, ())):
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        if queue.full():
+            queue.get_nowait()  # Slow consumer: drop the oldest event rather than grow
+        queue.put_nowait(event)
+
+    def follow(self, entry: ClientContainer):
+        """Start the single log reader for a running container, if following"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            thread = self._readers.get(entry.id)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(
+                target=self._read,
+                args=(entry, self._stopping),
+                name=f"logs-{entry.ign}",
+                daemon=True
+            )
+            self._readers[entry.id] = thread
+        thread.start()
+
+    def _on_container_event(self, action: str, entry: ClientContainer):
+        if entry.running:
+            self.follow(entry)
+        elif action == "destroy":
+            self._recent.pop(entry.ign, None)
+            self._last_seen.pop(entry.id, None)
+        self.publish(entry.ign, {"type": "status", "action": action, "status": entry.status})
+
+    def _read(self, entry: ClientContainer, stopping: threading.Event):
+        buffer = self._recent.setdefault(entry.ign, deque(maxlen=settings.LOG_BUFFER_LINES))
+        since = self._last_seen.get(entry.id)
+        # Lines up to this point are backlog: buffered for display on the
+        # first read, skipped on a re-follow, and never passed to sinks
+        live_after = since or datetime.now(timezone.utc)
+        pending = b""
+        try:
+            stream = get_docker_manager(entry.host).client_log_stream(
+                entry.id, tail=settings.LOG_BUFFER_LINES, since=since
+            )
+            for chunk in stream:
+                if stopping.is_set():
+                    break
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for raw in lines:
+                    self._handle(entry, buffer, raw, live_after, backfill=since is None)
+        except (DockerException, RequestException) as e:
+            logger.debug(f"Log stream for {entry.ign} ended: {e}")
+        finally:
+            if pending and not stopping.is_set():
+                self._handle(entry, buffer, pending, live_after, backfill=since is None)
+            with self._lock:
+                if self._readers.get(entry.id) is threading.current_thread():
+                    del self._readers[entry.id]
+
+    def _handle(self, entry: ClientContainer, buffer: deque, raw: bytes, live_after: datetime, backfill: bool):
+        text = raw.decode('utf-8', errors='replace').rstrip("\r")
+        stamp, _, line = text.partition(" ")
+        try:
+            timestamp = parse_docker_time(stamp)
+        except ValueError:
+            timestamp, line = datetime.now(timezone.utc), text
+        if timestamp <= live_after:
+            if backfill:
+                buffer.append(line)
+            return
+        self._last_seen[entry.id] = timestamp
+        self._dispatch(entry.ign, buffer, line, timestamp)
+
+    def _dispatch(self, ign: str, buffer: deque, line: str, timestamp: datetime):
+        buffer.append(line)
+        for sink in list(self._sinks):
+            try:
+                sink(ign, line, timestamp)
+            except Exception as e:
+                logger.error(f"Log sink failed for {ign}: {e}")
+        if ign in self._subscribers:
+            self.publish(ign, {"type": "log", "line": line})
+
+    def stop(self):
+        self._stopping.set()
+
+_log_hub = None
+
+def get_log_hub() -> LogHub:
+    """FastAPI dependency returning the process-wide LogHub"""
+    global _log_hub
+    if _log_hub is None:
+        _log_hub = LogHub(get_container_index())
+    return _log_hub
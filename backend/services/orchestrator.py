@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+from core.config import settings
+from models.user import User
+from services.container_index import ContainerIndex, get_container_index
+from services.scheduler import get_scheduler
+from services.supervisor import get_supervisor
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+START = "start"
+STOP = "stop"
+
+class SessionOrchestrator:
+    """Starts or stops many AFK clients at once with bounded parallelism.
+
+    Each IGN is an independent job: at most BULK_PARALLELISM run at a time
+    on a dedicated executor (so a mass restart does not queue behind, or
+    starve, the per-user lifecycle pool), failures are retried with
+    exponential backoff and jitter, and results are yielded as each IGN
+    finishes rather than when the whole batch does.
+    """
+
+    def __init__(self, index: ContainerIndex):
+        self.index = index
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.BULK_PARALLELISM,
+            thread_name_prefix="docker-bulk"
+        )
+
+    async def _call(self, method: str, *args):
+        def call():
+            return getattr(get_scheduler(), method)(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def _start(self, ign: str, user: User) -> dict:
+        if user is None:
+            return {"status": "failed", "detail": "No whitelisted account with this IGN"}
+        entry = self.index.get(ign)
+        if entry is not None and entry.running:
+            return {"status": "already_running", "container_id": entry.id}
+        await asyncio.to_thread(get_supervisor().reset, ign)
+        if entry is not None:
+            # An exited container still holds the name; clear it before run
+            await self._call("stop_client", ign)
+        container = await self._call("start_client", user)
+        return {"status": "started", "container_id": container.id}
+
+    async def _stop(self, ign: str) -> dict:
+        if self.index.get(ign) is None:
+            return {"status": "not_running"}
+        if not await self._call("stop_client", ign):
+            raise RuntimeError("Docker refused to stop the container")
+        return {"status": "stopped"}
+
+    async def _attempt(self, action: str, ign: str, user: User) -> dict:
+        delay = settings.BULK_RETRY_BASE_DELAY
+        for attempt in range(1, settings.BULK_MAX_ATTEMPTS + 1):
+            try:
+                if action == START:
+                    result = await self._start(ign, user)
+                else:
+                    result = await self._stop(ign)
+                return {"ign": ign, "attempts": attempt, **result}
+            except Exception as e:
+                if attempt == settings.BULK_MAX_ATTEMPTS:
+                    logger.error(f"Bulk {action} failed for {ign} after {attempt} attempts: {e}")
+                    return {"ign": ign, "attempts": attempt, "status": "failed", "detail": str(e)}
+                logger.warning(f"Bulk {action} attempt {attempt} failed for {ign}: {e}")
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, settings.BULK_RETRY_MAX_DELAY)
+
+    async def run(self, action: str, igns: list, users: dict = None):
+        """Apply action to every IGN, yielding one result dict per IGN as it completes.
+
+        users maps IGN -> User for starts; IGNs without one fail. Jobs keep
+        running if the caller stops iterating, so a dropped connection does
+        not leave a batch half-applied.
+        """
+        users = users or {}
+        semaphore = asyncio.Semaphore(settings.BULK_PARALLELISM)
+
+        async def job(ign: str):
+            async with semaphore:
+                return await self._attempt(action, ign, users.get(ign))
+
+        began = time.monotonic()
+        tasks = [asyncio.create_task(job(ign)) for ign in dict.fromkeys(igns)]
+        failed = 0
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            failed += result["status"] == "failed"
+            yield result
+        logger.info(f"Bulk {action} of {len(tasks)} clients finished, {failed} failed")
+        yield {
+            "done": True,
+            "total": len(tasks),
+            "failed": failed,
+            "elapsed": round(time.monotonic() - began, 3)
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_orchestrator = None
+
+def get_orchestrator() -> SessionOrchestrator:
+    """FastAPI dependency returning the process-wide SessionOrchestrator"""
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = SessionOrchestrator(get_container_index())
+    return _orchestrator
+
+def close_orchestrator():
+    global _orchestrator
+    if _orchestrator is not None:
+        _orchestrator.shutdown()
+        _orchestrator = None
@@ -0,0 +1,218 @@
+from collections import deque
+from dataclasses import asdict
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+from sqlalchemy.exc import SQLAlchemyError
+from core.config import settings
+from services.container_index import ClientContainer, ContainerIndex, get_container_index
+from services.docker_manager import docker_hosts, parse_docker_time
+from services.log_stream import LogHub, get_log_hub
+from services.state import get_state_backend
+from services.stats_collector import StatsCollector, get_stats_collector
+import json
+import logging
+import psycopg2
+import select as io_select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RELAY_CHANNEL = "afk_relay"
+LOG_CURSORS_KEY = "log_cursors"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_BYTES = 7900
+RELAY_MAX_LINE = 2000  # Characters of a log line relayed; the leader's sinks still get all of it
+
+def encode_entry(entry: ClientContainer) -> dict:
+    data = asdict(entry)
+    data["started_at"] = entry.started_at.isoformat() if entry.started_at else None
+    return data
+
+def decode_entry(data: dict) -> ClientContainer:
+    started_at = data.get("started_at")
+    return ClientContainer(**{**data, "started_at": parse_docker_time(started_at) if started_at else None})
+
+def batch_payloads(messages: list) -> list:
+    """JSON arrays of messages, each small enough for one NOTIFY"""
+    payloads, batch, size = [], [], 2
+    for message in messages:
+        encoded = json.dumps(message, separators=(",", ":"))
+        if batch and size + len(encoded.encode()) + 1 > NOTIFY_MAX_BYTES:
+            payloads.append("[" + ",".join(batch) + "]")
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded.encode()) + 1
+    if batch:
+        payloads.append("[" + ",".join(batch) + "]")
+    return payloads
+
+class ClusterRelay:
+    """Makes the leader the only worker reading Docker's event, stats and log streams.
+
+    The leader's ContainerIndex, StatsCollector and LogHub consume Docker,
+    and everything they see is relayed to the other workers over Postgres
+    NOTIFY, batched every RELAY_INTERVAL. Followers LISTEN and apply it to
+    their own copies, so /status, the SSE streams and recent logs are still
+    served from memory in every worker while Docker load grows with the
+    number of containers alone. A follower lists each host once when it
+    starts following (and every RELAY_RESYNC_INTERVAL) to seed its index;
+    its log buffers and stats fill from the relay.
+
+    The leader also saves how far it has read each container's logs, and
+    the next leader resumes from there, so lines logged during a handoff
+    still reach the log archive and item tracker. If a leader dies without
+    stopping, lines after its last save may reach them twice.
+    """
+
+    def __init__(self, index: ContainerIndex, log_hub: LogHub, stats: StatsCollector):
+        self.index = index
+        self.log_hub = log_hub
+        self.stats = stats
+        self._outbox = deque(maxlen=settings.RELAY_MAX_PENDING)  # messages for the next batch
+        self._samples = {}  # ign -> latest stats sample for the next batch
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._leading = False
+        self._publishing = threading.Event()
+        self._publishing.set()  # Until lead
+        self._mirroring = threading.Event()
+        self._mirroring.set()  # Until follow
+
+    @property
+    def shared(self) -> bool:
+        """Whether there are other workers to relay to (and a leader to follow)"""
+        return settings.STATE_BACKEND != "memory"
+
+    def lead(self):
+        """Stop following the relay and consume Docker here, relaying what is seen"""
+        with self._lock:
+            if self._leading:
+                return
+            self._leading = True
+            self._mirroring.set()
+            self._publishing = threading.Event()
+        if self.shared:
+            self.index.add_listener(self._on_container_event)
+            self.log_hub.add_sink(self._on_log_line)
+            self.stats.add_listener(self._on_stats)
+        self.index.start()
+        self.log_hub.start_following(get_state_backend().get(LOG_CURSORS_KEY) or {})
+        self.stats.start_tracking()
+        if self.shared:
+            threading.Thread(target=self._publish, args=(self._publishing,), name="relay-publish", daemon=True).start()
+
+    def follow(self):
+        """Stop consuming Docker and apply the relay instead; save_cursors once the sinks have flushed"""
+        with self._lock:
+            if not self._mirroring.is_set():
+                return
+            leading, self._leading = self._leading, False
+            self._mirroring = threading.Event()
+        if leading:
+            self.stats.stop_tracking()
+            self.log_hub.stop_following()
+            self.index.stop()
+            self._publishing.set()
+            self.index.remove_listener(self._on_container_event)
+            self.log_hub.remove_sink(self._on_log_line)
+            self.stats.remove_listener(self._on_stats)
+            try:
+                self.flush()
+            except SQLAlchemyError as e:
+                logger.warning(f"Failed to hand the relay over: {e}")
+        if self.shared:
+            threading.Thread(target=self._mirror, args=(self._mirroring,), name="relay-mirror", daemon=True).start()
+
+    def save_cursors(self):
+        """Record how far the sinks have read each container's logs"""
+        if self.shared:
+            get_state_backend().set(LOG_CURSORS_KEY, self.log_hub.cursors())
+
+    def _on_container_event(self, action: str, entry: ClientContainer):
+        self._outbox.append(["c", action, encode_entry(entry)])
+
+    def _on_log_line(self, ign: str, line: str, timestamp=None):
+        self._outbox.append(["l", ign, line[:RELAY_MAX_LINE], timestamp.isoformat()])
+
+    def _on_stats(self, ign: str, stats: dict):
+        self._samples[ign] = stats
+
+    def flush(self):
+        """NOTIFY the followers of everything seen since the last batch; dropped if that fails"""
+        with self._flush_lock:
+            with self._lock:
+                messages = list(self._outbox)
+                self._outbox.clear()
+                samples, self._samples = self._samples, {}
+            messages += [["s", ign, stats] for ign, stats in samples.items()]
+            if messages:
+                get_state_backend().notify(RELAY_CHANNEL, batch_payloads(messages))
+
+    def _publish(self, stopping: threading.Event):
+        next_save = time.monotonic() + settings.LOG_CURSOR_SAVE_INTERVAL
+        while not stopping.wait(settings.RELAY_INTERVAL):
+            try:
+                self.flush()
+                if time.monotonic() >= next_save:
+                    self.save_cursors()
+                    next_save = time.monotonic() + settings.LOG_CURSOR_SAVE_INTERVAL
+            except SQLAlchemyError as e:
+                logger.warning(f"Failed to relay to followers: {e}")
+
+    def _resync(self):
+        for host in docker_hosts():
+            self.index.load(host)
+
+    def _apply(self, payload: str):
+        for message in json.loads(payload):
+            kind = message[0]
+            if kind == "c":
+                self.index.apply_relayed(message[1], decode_entry(message[2]))
+            elif kind == "l":
+                self.log_hub.inject(message[1], message[2], parse_docker_time(message[3]))
+            elif kind == "s":
+                self.stats.inject(message[1], message[2])
+
+    def _mirror(self, stopping: threading.Event):
+        backoff = 1
+        while not stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(settings.DATABASE_URL)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {RELAY_CHANNEL};")
+                # List after LISTEN so no change between the two is missed
+                self._resync()
+                backoff = 1
+                next_resync = time.monotonic() + settings.RELAY_RESYNC_INTERVAL
+                while not stopping.is_set():
+                    if io_select.select([connection], [], [], 1)[0]:
+                        connection.poll()
+                        while connection.notifies and not stopping.is_set():
+                            self._apply(connection.notifies.pop(0).payload)
+                    if time.monotonic() >= next_resync:
+                        self._resync()
+                        next_resync = time.monotonic() + settings.RELAY_RESYNC_INTERVAL
+            except (psycopg2.Error, DockerException, RequestException, ValueError) as e:
+                logger.warning(f"Relay listener interrupted: {e}")
+            finally:
+                if connection is not None:
+                    connection.close()
+            if not stopping.is_set():
+                stopping.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def stop(self):
+        self._mirroring.set()
+        self._publishing.set()
+
+_relay = None
+
+def get_relay() -> ClusterRelay:
+    """Return the process-wide ClusterRelay"""
+    global _relay
+    if _relay is None:
+        _relay = ClusterRelay(get_container_index(), get_log_hub(), get_stats_collector())
+    return _relay
@@ -0,0 +1,154 @@
+from docker.errors import DockerException
+from docker.utils import parse_bytes
+from requests.exceptions import RequestException
+from core.admission import ConcurrencyLimit
+from core.cache import TTLCache
+from core.config import settings
+from core import metrics
+from models.user import User
+from services.container_index import ClientContainer, ContainerIndex, get_container_index
+from services.docker_manager import docker_hosts, get_docker_manager
+from services.state import get_state_backend
+from services.stats_collector import get_stats_collector
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Shared by every start/stop path: API routes, bulk operations and the supervisor
+lifecycle_slots = ConcurrencyLimit(settings.LIFECYCLE_MAX_CONCURRENCY)
+
+class CapacityError(RuntimeError):
+    """Every Docker host is at its client limit"""
+
+class Scheduler:
+    """Places AFK clients on the least-loaded of the configured Docker hosts.
+
+    A host's load is the memory committed to its clients: each running
+    client counts the larger of its observed usage (from the stats
+    collector) and CLIENT_MEM_LIMIT, and each start still in flight counts
+    one per-client estimate. A new client goes to the host with the lowest
+    committed share of HOST_MEMORY_FRACTION of its RAM that can still fit
+    it, and to none (CapacityError) when every host is full.
+    """
+
+    def __init__(self, index: ContainerIndex, stats: TTLCache, hosts: list = None):
+        self.index = index
+        self.stats = stats
+        self.hosts = list(hosts or docker_hosts())
+        self._info = {}  # host -> (fetched_at, {"memory", "cpus"})
+        self._pending = {}  # ign -> host of a start not yet seen running in the index
+        self._lock = threading.Lock()
+        index.add_listener(self._on_container_event)
+
+    def host_info(self, host: str) -> dict:
+        """Total memory and CPUs of a host, refreshed every HOST_INFO_TTL"""
+        cached = self._info.get(host)
+        if cached is None or cached[0] + settings.HOST_INFO_TTL < time.monotonic():
+            info = get_docker_manager(host).info()
+            cached = (time.monotonic(), {"memory": info["MemTotal"], "cpus": info["NCPU"]})
+            self._info[host] = cached
+        return cached[1]
+
+    def load(self, host: str) -> dict:
+        """Clients and committed client memory on a host, counting starts still in flight"""
+        reservation = parse_bytes(settings.CLIENT_MEM_LIMIT) if settings.CLIENT_MEM_LIMIT else 0
+        observed = [
+            (self.stats.peek(entry.ign) or {}).get("memory_usage", 0)
+            for entry in self.index.running(host)
+        ]
+        estimate = reservation or (sum(observed) // len(observed) if observed else 0)
+        pending = sum(1 for pending_host in list(self._pending.values()) if pending_host == host)
+        committed = sum(max(usage, reservation) for usage in observed) + pending * estimate
+        budget = self.host_info(host)["memory"] * settings.HOST_MEMORY_FRACTION
+        clients = len(observed) + pending
+        metrics.HOST_CLIENTS.labels(host=host).set(clients)
+        metrics.HOST_MEMORY_LOAD.labels(host=host).set(committed / budget if budget else 0)
+        return {
+            "host": host,
+            "clients": clients,
+            "committed": committed,
+            "budget": budget,
+            "estimate": estimate
+        }
+
+    def place(self, ign: str) -> str:
+        """Pick and reserve the host for an IGN's client, or raise CapacityError"""
+        entry = self.index.get(ign)
+        if entry is not None and entry.host in self.hosts:
+            return entry.host  # The container name is already taken there
+        with self._lock:
+            candidates = []
+            for host in self.hosts:
+                try:
+                    load = self.load(host)
+                except (DockerException, RequestException) as e:
+                    logger.warning(f"Skipping unreachable Docker host {host}: {e}")
+                    continue
+                if settings.HOST_MAX_CLIENTS and load["clients"] >= settings.HOST_MAX_CLIENTS:
+                    continue
+                if load["committed"] + load["estimate"] > load["budget"]:
+                    continue
+                candidates.append((load["committed"] / load["budget"], load["clients"], host))
+            if not candidates:
+                metrics.PLACEMENT_REJECTIONS.inc()
+                raise CapacityError("All Docker hosts are at capacity")
+            host = min(candidates)[2]
+            self._pending[ign] = host
+        return host
+
+    def release(self, ign: str):
+        self._pending.pop(ign, None)
+
+    def _on_container_event(self, action: str, entry: ClientContainer):
+        if entry.running:
+            self.release(entry.ign)
+
+    def start_client(self, user: User):
+        """Start the user's client on the host chosen by place.
+
+        Takes one of the worker's lifecycle slots, then the IGN's cluster-wide
+        lock so two workers never race to run the same container name; a
+        start queued for a slot holds no lock or database connection.
+        """
+        with lifecycle_slots.slot(settings.LIFECYCLE_QUEUE_TIMEOUT), \
+                get_state_backend().lock(f"client:{user.ign}", settings.CLIENT_LOCK_TIMEOUT):
+            host = self.place(user.ign)
+            try:
+                return get_docker_manager(host).start_minecraft_client(user)
+            except Exception:
+                self.release(user.ign)
+                raise
+
+    def stop_client(self, ign: str) -> bool:
+        """Stop the user's client on whichever host runs it"""
+        with lifecycle_slots.slot(settings.LIFECYCLE_QUEUE_TIMEOUT), \
+                get_state_backend().lock(f"client:{ign}", settings.CLIENT_LOCK_TIMEOUT):
+            entry = self.index.get(ign)
+            return get_docker_manager(entry.host if entry else None).stop_minecraft_client(ign)
+
+    def restart_client(self, entry: ClientContainer) -> bool:
+        """Restart a client in place unless it was stopped or replaced meanwhile; returns whether it was.
+
+        Takes the same slot and IGN lock as start_client and stop_client, so
+        an automatic restart never interleaves with the user's own start or
+        stop on any worker.
+        """
+        with lifecycle_slots.slot(settings.LIFECYCLE_QUEUE_TIMEOUT), \
+                get_state_backend().lock(f"client:{entry.ign}", settings.CLIENT_LOCK_TIMEOUT):
+            current = self.index.get(entry.ign)
+            if current is None or current.id != entry.id:
+                return False
+            # A stop the index has not seen yet removed the container, so this raises NotFound
+            get_docker_manager(entry.host).restart_client(entry.id)
+            return True
+
+_scheduler = None
+
+def get_scheduler() -> Scheduler:
+    """Return the process-wide Scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler(get_container_index(), get_stats_collector().cache)
+    return _scheduler
@@ -0,0 +1,212 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from core.config import settings
+from services.docker_manager import AsyncDockerManager, get_async_docker_manager
+from services.state import LockTimeout, get_state_backend
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+class ServerStateError(RuntimeError):
+    """The server is not in the state the request needs"""
+
+SERVER_KEY = "server"
+NODE = socket.gethostname()
+# Longer output lines are kept in pieces of this size
+MAX_LINE_BYTES = 64 * 1024
+
+def read_state():
+    """Shared state of the server process, or None if none is running"""
+    state = get_state_backend().get(SERVER_KEY)
+    if state is None:
+        return None
+    if state.get("node") == NODE and not process_alive(state.get("pid")):
+        return None  # Died with the worker that started it
+    return state
+
+def write_state(state):
+    """Replace (or with None, remove) the shared state"""
+    get_state_backend().set(SERVER_KEY, state)
+
+def process_alive(pid) -> bool:
+    """Whether pid is still a server process (guards against a reused pid)"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return os.path.basename(settings.SERVER_COMMAND[0]).encode() in f.read()
+    except FileNotFoundError:
+        return True  # No procfs; trust the signal check
+
+@asynccontextmanager
+async def state_lock():
+    """Cluster-wide exclusive lock around server start/stop"""
+    lock = get_state_backend().lock(SERVER_KEY, timeout=0)
+    try:
+        await asyncio.to_thread(lock.__enter__)
+    except LockTimeout:
+        raise ServerStateError("Server is being started or stopped by another worker")
+    try:
+        yield
+    except BaseException:
+        await asyncio.to_thread(lock.__exit__, *sys.exc_info())
+        raise
+    else:
+        await asyncio.to_thread(lock.__exit__, None, None, None)
+
+class ProcessServer:
+    """Runs the Minecraft server as a child process of this backend worker.
+
+    Output is drained continuously into a ring buffer so the server never
+    blocks on a full pipe. Stop sends "stop" on stdin and waits up to
+    SERVER_STOP_TIMEOUT for the world to save before killing. State lives
+    in the shared state backend so every worker sees the same server; a
+    worker on the same node that did not start it stops it with SIGTERM,
+    which runs the server's own save-and-exit shutdown hook.
+    """
+
+    def __init__(self):
+        self.output = deque(maxlen=settings.SERVER_OUTPUT_LINES)
+        self._process = None
+        self._drainer = None
+
+    async def start(self) -> dict:
+        async with state_lock():
+            if await asyncio.to_thread(read_state) is not None:
+                raise ServerStateError("Server is already running")
+            process = await asyncio.create_subprocess_exec(
+                *settings.SERVER_COMMAND,
+                cwd=settings.SERVER_DIR,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            await asyncio.to_thread(
+                write_state, {"pid": process.pid, "start_time": time.time(), "owner": os.getpid(), "node": NODE}
+            )
+        self._process = process
+        self.output.clear()
+        self._drainer = asyncio.create_task(self._drain(process))
+        logger.info(f"Started Minecraft server process {process.pid}")
+        return {"status": "started", "pid": process.pid}
+
+    async def _drain(self, process):
+        # Read chunks rather than readline(), which raises on a line over the stream limit
+        pending = b""
+        while True:
+            chunk = await process.stdout.read(MAX_LINE_BYTES)
+            if not chunk:
+                break
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            if len(pending) >= MAX_LINE_BYTES:
+                lines.append(pending)
+                pending = b""
+            self.output.extend(line.decode("utf-8", errors="replace").rstrip() for line in lines)
+        if pending:
+            self.output.append(pending.decode("utf-8", errors="replace").rstrip())
+        returncode = await process.wait()
+        logger.info(f"Minecraft server process {process.pid} exited with {returncode}")
+        state = await asyncio.to_thread(read_state)
+        if state is None or (state.get("node") == NODE and state["pid"] == process.pid):
+            await asyncio.to_thread(write_state, None)
+
+    async def stop(self) -> dict:
+        async with state_lock():
+            state = await asyncio.to_thread(read_state)
+            if state is None:
+                raise ServerStateError("Server is not running")
+            if state.get("node") != NODE:
+                raise ServerStateError(f"Server runs on {state.get('node')}; stop it from a worker there")
+            process = self._process
+            if process is not None and process.pid == state["pid"] and process.returncode is None:
+                try:
+                    process.stdin.write(b"stop\n")
+                    await process.stdin.drain()
+                    await asyncio.wait_for(process.wait(), settings.SERVER_STOP_TIMEOUT)
+                except (asyncio.TimeoutError, ConnectionError):
+                    logger.warning("Minecraft server did not stop in time, killing it")
+                    process.kill()
+                    await process.wait()
+            else:
+                await self._terminate(state["pid"])
+            await asyncio.to_thread(write_state, None)
+        return {"status": "stopped"}
+
+    async def _terminate(self, pid: int):
+        """Stop a server started by another worker: SIGTERM, then SIGKILL after the timeout"""
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + settings.SERVER_STOP_TIMEOUT
+        while process_alive(pid):
+            if time.monotonic() > deadline:
+                logger.warning("Minecraft server did not stop in time, killing it")
+                os.kill(pid, signal.SIGKILL)
+                break
+            await asyncio.sleep(0.5)
+
+    async def status(self) -> dict:
+        state = await asyncio.to_thread(read_state)
+        if state is None:
+            return {"status": "not_running", "uptime": 0, "pid": None}
+        return {"status": "running", "uptime": time.time() - state["start_time"], "pid": state["pid"]}
+
+    async def recent(self, lines: int) -> list:
+        """Latest output lines; only the worker that started the server holds them"""
+        return list(self.output)[-lines:]
+
+    async def shutdown(self):
+        """Stop the server with the backend if this worker owns it"""
+        if self._process is not None and self._process.returncode is None:
+            await self.stop()
+
+class DockerServer:
+    """The Minecraft server as the mc-server container, behind the same interface"""
+
+    def __init__(self, docker_manager: AsyncDockerManager):
+        self.docker_manager = docker_manager
+
+    async def start(self) -> dict:
+        async with state_lock():
+            if (await self.docker_manager.get_server_status())["status"] == "running":
+                raise ServerStateError("Server is already running")
+            container = await self.docker_manager.start_minecraft_server()
+        return {"status": "started", "pid": container.id}
+
+    async def stop(self) -> dict:
+        async with state_lock():
+            if not await self.docker_manager.stop_minecraft_server():
+                raise ServerStateError("Server is not running")
+        return {"status": "stopped"}
+
+    async def status(self) -> dict:
+        return await self.docker_manager.get_server_status()
+
+    async def recent(self, lines: int) -> list:
+        return await self.docker_manager.server_logs(lines)
+
+    async def shutdown(self):
+        pass  # The container outlives the backend
+
+_server = None
+
+def get_server():
+    """FastAPI dependency returning the process-wide server manager for SERVER_MODE"""
+    global _server
+    if _server is None:
+        if settings.SERVER_MODE == "docker":
+            _server = DockerServer(get_async_docker_manager())
+        else:
+            _server = ProcessServer()
+    return _server
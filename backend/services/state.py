@@ -0,0 +1,177 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from core.config import settings
+from database import get_engine
+from models.user import RuntimeState
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# First key of every advisory lock this service takes, so it cannot collide with other users of the database
+LOCK_NAMESPACE = 0x41464B
+LEADER_LOCK = "leader"
+
+class LockTimeout(RuntimeError):
+    """A shared lock could not be acquired in time"""
+
+class MemoryStateBackend:
+    """Runtime state, locks and leadership within a single process.
+
+    Correct only with one worker; used for single-worker deployments,
+    benchmarks and tests.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def get(self, key: str):
+        return self._values.get(key)
+
+    def set(self, key: str, value):
+        """Store a JSON-serializable value; None deletes the key"""
+        if value is None:
+            self._values.pop(key, None)
+        else:
+            self._values[key] = value
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = None):
+        """Exclusive lock on name; raises LockTimeout after timeout seconds"""
+        with self._guard:
+            lock = self._locks[name]
+        if not lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout(f"Timed out waiting for lock {name}")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def notify(self, channel: str, payloads: list):
+        """Broadcast to the other workers; there are none"""
+
+    def hold_leadership(self) -> bool:
+        return True
+
+    def release_leadership(self):
+        pass
+
+class PostgresStateBackend:
+    """Runtime state, locks and leadership shared by every worker through Postgres.
+
+    Values live in the runtime_state table. Locks are transaction-scoped
+    advisory locks, so a crashed worker's locks vanish with its connection.
+    The leader holds a session-level advisory lock on a dedicated
+    connection for as long as it lives; losing that connection loses
+    leadership.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._leader = None  # Connection holding the leader lock
+        self._leader_lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.engine.connect() as connection:
+            return connection.execute(select(RuntimeState.value).where(RuntimeState.key == key)).scalar_one_or_none()
+
+    def set(self, key: str, value):
+        """Store a JSON-serializable value; None deletes the key"""
+        with self.engine.begin() as connection:
+            if value is None:
+                connection.execute(delete(RuntimeState).where(RuntimeState.key == key))
+                return
+            statement = insert(RuntimeState).values(key=key, value=value)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=["key"],
+                set_={"value": statement.excluded.value, "updated_at": func.now()}
+            ))
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = None):
+        """Exclusive cluster-wide lock on name; raises LockTimeout after timeout seconds"""
+        with self.engine.connect() as connection, connection.begin():
+            # lock_timeout 0 means wait forever, so a zero timeout becomes 1ms
+            wait = f"{max(int(timeout * 1000), 1)}ms" if timeout is not None else "0"
+            connection.execute(
+                text("SELECT set_config('lock_timeout', :wait, true), set_config('statement_timeout', '0', true)"),
+                {"wait": wait}
+            )
+            try:
+                connection.execute(
+                    text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:name))"),
+                    {"namespace": LOCK_NAMESPACE, "name": name}
+                )
+            except OperationalError as e:
+                if getattr(e.orig, "pgcode", None) == "55P03":  # lock_not_available
+                    raise LockTimeout(f"Timed out waiting for lock {name}") from e
+                raise
+            yield
+
+    def notify(self, channel: str, payloads: list):
+        """NOTIFY every worker LISTENing on channel, in order, in one transaction"""
+        with self.engine.begin() as connection:
+            for payload in payloads:
+                connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+    def hold_leadership(self) -> bool:
+        """Take the leader lock if free, or confirm we still hold it"""
+        with self._leader_lock:
+            try:
+                if self._leader is not None:
+                    self._leader.execute(text("SELECT 1"))
+                    return True
+                connection = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+                try:
+                    acquired = connection.execute(
+                        text("SELECT pg_try_advisory_lock(:namespace, hashtext(:name))"),
+                        {"namespace": LOCK_NAMESPACE, "name": LEADER_LOCK}
+                    ).scalar()
+                except SQLAlchemyError:
+                    connection.close()
+                    raise
+                if not acquired:
+                    connection.close()
+                    return False
+                self._leader = connection
+                return True
+            except SQLAlchemyError as e:
+                logger.warning(f"Lost the leader lock connection: {e}")
+                if self._leader is not None:
+                    self._leader.invalidate()
+                    self._leader.close()
+                    self._leader = None
+                return False
+
+    def release_leadership(self):
+        with self._leader_lock:
+            if self._leader is None:
+                return
+            try:
+                self._leader.execute(
+                    text("SELECT pg_advisory_unlock(:namespace, hashtext(:name))"),
+                    {"namespace": LOCK_NAMESPACE, "name": LEADER_LOCK}
+                )
+                self._leader.close()
+            except SQLAlchemyError as e:
+                logger.warning(f"Failed to release the leader lock: {e}")
+                self._leader.invalidate()
+                self._leader.close()
+            self._leader = None
+
+_state_backend = None
+
+def get_state_backend():
+    """Return the process-wide state backend selected by STATE_BACKEND"""
+    global _state_backend
+    if _state_backend is None:
+        if settings.STATE_BACKEND == "memory":
+            _state_backend = MemoryStateBackend()
+        else:
+            _state_backend = PostgresStateBackend(get_engine())
+    return _state_backend
@@ -0,0 +1,151 @@
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+from core.cache import TTLCache
+from core.config import settings
+from core import metrics
+from services.container_index import ClientContainer, ContainerIndex, get_container_index
+from services.docker_manager import get_docker_manager, summarize_client_stats, uptime_since
+from services.log_stream import LogHub, get_log_hub
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class StatsCollector:
+    """Keeps the latest status/stats snapshot of every client container in memory.
+
+    While tracking (on the leader), one streaming stats subscription is
+    held per running container, started and stopped from container index
+    events, so Docker load grows with the number of containers rather than
+    with API requests or workers; followers receive the samples through
+    inject. Log tails come from the LogHub's per-container buffer.
+    """
+
+    def __init__(self, index: ContainerIndex, log_hub: LogHub):
+        self.index = index
+        self.log_hub = log_hub
+        self.cache = TTLCache(
+            maxsize=settings.STATS_CACHE_MAX_ENTRIES,
+            ttl=settings.STATS_CACHE_TTL
+        )
+        metrics.register_cache("stats", self.cache)
+        self._streams = {}  # container id -> stats stream thread
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stopping.set()  # Until start_tracking
+        index.add_listener(self._on_container_event)
+
+    def snapshot(self, ign: str):
+        """Latest snapshot for an IGN, or None if it has no running container.
+
+        Session time comes from the indexed StartedAt, CPU and memory from
+        the last streamed sample, so no Docker call is made per request.
+        """
+        entry = self.index.get(ign)
+        if entry is None or not entry.running:
+            return None
+        return {
+            "status": entry.status,
+            "logs": "\n".join(self.log_hub.recent(ign, 10)),
+            "stats": {
+                "cpu_usage": 0,
+                "memory_usage": 0,
+                **(self.cache.get(ign) or {}),
+                "session_time": uptime_since(entry.started_at)
+            }
+        }
+
+    def add_listener(self, callback):
+        """Call callback(ign, stats) with every new stats sample"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def start_tracking(self):
+        """Follow the stats of every running container, and of each one that starts later"""
+        with self._lock:
+            if not self._stopping.is_set():
+                return
+            self._stopping = threading.Event()
+        for entry in self.index.running():
+            self.track(entry)
+
+    def stop_tracking(self):
+        """Close every stats stream; samples after this arrive only through inject"""
+        self._stopping.set()
+
+    def inject(self, ign: str, stats: dict):
+        """Handle a sample streamed by another worker as if it came from a stream here"""
+        self._update(ign, stats)
+
+    def track(self, entry: ClientContainer):
+        """Start following a client container's stats stream, if tracking"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            thread = self._streams.get(entry.id)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(
+                target=self._follow,
+                args=(entry, self._stopping),
+                name=f"stats-{entry.ign}",
+                daemon=True
+            )
+            self._streams[entry.id] = thread
+        thread.start()
+
+    def forget(self, ign: str):
+        """Drop the snapshot of a client that has stopped"""
+        self.cache.pop(ign)
+
+    def _on_container_event(self, action: str, entry: ClientContainer):
+        if entry.running:
+            self.track(entry)
+        elif action in ("die", "destroy", "sync"):
+            self.forget(entry.ign)
+
+    def _follow(self, entry: ClientContainer, stopping: threading.Event):
+        try:
+            for stats in get_docker_manager(entry.host).client_stats_stream(entry.id):
+                if stopping.is_set():
+                    break
+                if not stats.get('read') or 'usage' not in stats.get('memory_stats', {}):
+                    continue  # Container is exiting; Docker sends an empty sample
+                self._update(entry.ign, summarize_client_stats(stats))
+        except (DockerException, RequestException) as e:
+            logger.debug(f"Stats stream for {entry.ign} ended: {e}")
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Unexpected stats payload for {entry.ign}: {e}")
+        finally:
+            with self._lock:
+                if self._streams.get(entry.id) is threading.current_thread():
+                    del self._streams[entry.id]
+
+    def _update(self, ign: str, stats: dict):
+        previous = self.cache.peek(ign) or {}
+        self.cache.set(ign, stats)
+        for callback in list(self._listeners):
+            try:
+                callback(ign, stats)
+            except Exception as e:
+                logger.error(f"Stats listener failed for {ign}: {e}")
+        if self.log_hub.has_subscribers(ign):
+            delta = {key: value for key, value in stats.items() if previous.get(key) != value}
+            if delta:
+                self.log_hub.publish(ign, {"type": "stats", **delta})
+
+    def stop(self):
+        self._stopping.set()
+
+_stats_collector = None
+
+def get_stats_collector() -> StatsCollector:
+    """FastAPI dependency returning the process-wide StatsCollector"""
+    global _stats_collector
+    if _stats_collector is None:
+        _stats_collector = StatsCollector(get_container_index(), get_log_hub())
+    return _stats_collector
@@ -0,0 +1,262 @@
+from array import array
+from collections import OrderedDict
+from sqlalchemy import BigInteger, case, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
+from database import SessionLocal
+from models.user import StatsRollup
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# (bucket seconds, buckets): 1 hour at 10s, 6 hours at 1 min, 7 days at 1 hour
+STATS_HISTORY_TIERS = ((10, 360), (60, 360), (3600, 168))
+HOURLY_TIER = 2
+
+# range -> (tier index, or None to merge persisted hourly rollups with the hourly tier; seconds covered)
+HISTORY_RANGES = {
+    "1h": (0, 3600),
+    "6h": (1, 6 * 3600),
+    "7d": (None, 7 * 86400),
+    "30d": (None, 30 * 86400),
+}
+
+class Tier:
+    """Fixed-size ring of time buckets held in typed arrays (22 bytes per bucket).
+
+    A bucket's slot is its number modulo the ring size, so writes are O(1)
+    and a slot still holding an older bucket is simply reset on reuse.
+    """
+
+    def __init__(self, step: int, size: int):
+        self.step = step
+        self.size = size
+        self.buckets = array("q", [-1]) * size
+        self.counts = array("H", [0]) * size
+        self.cpu = array("f", [0.0]) * size
+        self.memory = array("f", [0.0]) * size
+        self.items = array("I", [0]) * size
+
+    def _slot(self, timestamp: float) -> int:
+        bucket = int(timestamp // self.step)
+        slot = bucket % self.size
+        if self.buckets[slot] != bucket:
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+            self.cpu[slot] = 0.0
+            self.memory[slot] = 0.0
+            self.items[slot] = 0
+        return slot
+
+    def add_sample(self, timestamp: float, cpu: float, memory: float):
+        slot = self._slot(timestamp)
+        if self.counts[slot] < 65535:
+            self.counts[slot] += 1
+            self.cpu[slot] += cpu
+            self.memory[slot] += memory
+
+    def add_items(self, timestamp: float, count: int):
+        slot = self._slot(timestamp)
+        self.items[slot] += count
+
+    def rows(self, since: float) -> list:
+        """(bucket_start, samples, cpu_avg, memory_avg, items) for buckets starting at or after since, oldest first"""
+        first = int(since // self.step)
+        rows = []
+        for slot in range(self.size):
+            bucket = self.buckets[slot]
+            if bucket < first:
+                continue
+            count = self.counts[slot]
+            rows.append((
+                bucket * self.step,
+                count,
+                self.cpu[slot] / count if count else None,
+                self.memory[slot] / count if count else None,
+                self.items[slot]
+            ))
+        rows.sort()
+        return rows
+
+class Series:
+    """All tiers of one IGN"""
+
+    def __init__(self):
+        self.tiers = [Tier(step, size) for step, size in STATS_HISTORY_TIERS]
+        self.lock = threading.Lock()
+
+class StatsHistory:
+    """Downsampled CPU, memory and item-rate history per IGN.
+
+    Every stats sample and item pickup lands in all tiers at once, each a
+    fixed-size ring, so memory per IGN is constant (about 20 KB) and at
+    most STATS_HISTORY_MAX_SERIES IGNs are kept, least recently updated
+    first out. Hourly buckets are added into stats_rollups so the hourly
+    ranges survive restarts and leader changes: each flush writes only
+    what was recorded since the previous one, and the stored row combines
+    it with what earlier flushes (possibly by another leader) wrote.
+    """
+
+    def __init__(self):
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self._flushed = {}  # (ign, hour) -> (samples, cpu sum, memory sum, items) already written
+
+    def _get(self, ign: str) -> Series:
+        with self._lock:
+            series = self._series.get(ign)
+            if series is None:
+                series = self._series[ign] = Series()
+                while len(self._series) > settings.STATS_HISTORY_MAX_SERIES:
+                    self._series.popitem(last=False)
+            else:
+                self._series.move_to_end(ign)
+            return series
+
+    def record(self, ign: str, stats: dict):
+        """StatsCollector listener: add a CPU/memory sample"""
+        now = time.time()
+        series = self._get(ign)
+        with series.lock:
+            for tier in series.tiers:
+                tier.add_sample(now, stats.get("cpu_usage", 0), stats.get("memory_usage", 0))
+
+    def record_items(self, ign: str, count: int):
+        """ItemTracker listener: count picked up items"""
+        now = time.time()
+        series = self._get(ign)
+        with series.lock:
+            for tier in series.tiers:
+                tier.add_items(now, count)
+
+    def rows(self, ign: str, tier: int, since: float) -> list:
+        series = self._series.get(ign)
+        if series is None:
+            return []
+        with series.lock:
+            return series.tiers[tier].rows(since)
+
+    async def query(self, ign: str, range_name: str, db: AsyncSession) -> dict:
+        """Columnar series for a range; the hourly ranges (7d, 30d) also read the database"""
+        tier, seconds = HISTORY_RANGES[range_name]
+        since = time.time() - seconds
+        if tier is not None:
+            rows = self.rows(ign, tier, since)
+            step = STATS_HISTORY_TIERS[tier][0]
+        else:
+            step = STATS_HISTORY_TIERS[HOURLY_TIER][0]
+            stored = await db.execute(
+                select(
+                    StatsRollup.hour, StatsRollup.samples, StatsRollup.cpu_usage,
+                    StatsRollup.memory_usage, StatsRollup.items
+                ).where(StatsRollup.ign == ign, StatsRollup.hour >= int(since // step))
+            )
+            merged = {hour * step: (hour * step, *values) for hour, *values in stored.all()}
+            # An hour in both is taken from whichever saw more samples: memory is ahead of the
+            # last flush, but after a restart it only holds what arrived since
+            for row in self.rows(ign, HOURLY_TIER, since):
+                if row[0] not in merged or row[1] >= merged[row[0]][1]:
+                    merged[row[0]] = row
+            rows = sorted(merged.values())
+        return {
+            "range": range_name,
+            "step": step,
+            "timestamps": [row[0] for row in rows],
+            "cpu_usage": [None if row[2] is None else round(row[2], 2) for row in rows],
+            "memory_usage": [None if row[3] is None else int(row[3]) for row in rows],
+            "items": [row[4] for row in rows]
+        }
+
+    def _totals(self) -> dict:
+        """(ign, hour) -> (samples, cpu sum, memory sum, items) of the last two hourly buckets"""
+        step = STATS_HISTORY_TIERS[HOURLY_TIER][0]
+        since = time.time() - 2 * step
+        return {
+            (ign, start // step): (samples, (cpu or 0) * samples, (memory or 0) * samples, items)
+            for ign in list(self._series)
+            for start, samples, cpu, memory, items in self.rows(ign, HOURLY_TIER, since)
+        }
+
+    def mark_flushed(self):
+        """Treat everything recorded so far as written, e.g. by the leader this worker takes over from"""
+        self._flushed = self._totals()
+
+    def flush(self) -> int:
+        """Add what the last two hourly buckets gained since the previous flush; returns rows written"""
+        step = STATS_HISTORY_TIERS[HOURLY_TIER][0]
+        totals = self._totals()
+        rows = []
+        for (ign, hour), (samples, cpu, memory, items) in totals.items():
+            done = self._flushed.get((ign, hour), (0, 0.0, 0.0, 0))
+            samples, cpu, memory, items = samples - done[0], cpu - done[1], memory - done[2], items - done[3]
+            if samples <= 0 and items <= 0:
+                continue
+            rows.append({
+                "ign": ign, "hour": hour, "samples": max(samples, 0),
+                "cpu_usage": cpu / samples if samples > 0 else None,
+                "memory_usage": int(memory / samples) if samples > 0 else None,
+                "items": max(items, 0)
+            })
+        db = SessionLocal()
+        try:
+            if rows:
+                statement = insert(StatsRollup).values(rows)
+                combined = StatsRollup.samples + statement.excluded["samples"]
+
+                def weighted(column):
+                    # Sample-weighted average of the stored row and this flush's delta
+                    total = (
+                        func.coalesce(column, 0) * StatsRollup.samples
+                        + func.coalesce(statement.excluded[column.key], 0) * statement.excluded["samples"]
+                    )
+                    return case((combined > 0, total / combined), else_=None)
+
+                statement = statement.on_conflict_do_update(
+                    index_elements=["ign", "hour"],
+                    set_={
+                        "samples": combined,
+                        "cpu_usage": weighted(StatsRollup.cpu_usage),
+                        "memory_usage": cast(weighted(StatsRollup.memory_usage), BigInteger),
+                        "items": StatsRollup.items + statement.excluded["items"]
+                    }
+                )
+                db.execute(statement)
+            cutoff = int((time.time() - settings.STATS_HISTORY_RETENTION_DAYS * 86400) // step)
+            db.execute(delete(StatsRollup).where(StatsRollup.hour < cutoff))
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Failed to persist {len(rows)} stats rollups: {e}")
+            return 0
+        finally:
+            db.close()
+        self._flushed = totals
+        return len(rows)
+
+    async def run(self):
+        """Persist hourly rollups every STATS_HISTORY_FLUSH_INTERVAL seconds.
+
+        What this worker recorded before it started persisting was the
+        previous leader's to write, so only samples from here on are added.
+        """
+        self.mark_flushed()
+        while True:
+            await asyncio.sleep(settings.STATS_HISTORY_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Stats history flush failed: {e}")
+
+_stats_history = None
+
+def get_stats_history() -> StatsHistory:
+    """FastAPI dependency returning the process-wide StatsHistory"""
+    global _stats_history
+    if _stats_history is None:
+        _stats_history = StatsHistory()
+    return _stats_history
@@ -0,0 +1,257 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+from sqlalchemy.exc import SQLAlchemyError
+from core.admission import LifecycleBusy
+from core.cache import TTLCache
+from core.config import settings
+from core import metrics
+from services.container_index import ClientContainer, ContainerIndex, get_container_index
+from services.item_tracker import CHAT_MESSAGE
+from services.log_stream import LogHub, get_log_hub
+from services.scheduler import get_scheduler
+from services.state import LockTimeout, get_state_backend
+from services.whitelist import WhitelistCache, get_whitelist_cache
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class Supervisor:
+    """Restarts dead or disconnected AFK clients and gives up on hopeless ones.
+
+    Watches the container index for clients that exit and the client logs
+    for kick/disconnect and authentication failures. Crashes and kicks are
+    restarted after an exponential backoff with jitter; more than
+    SUPERVISOR_MAX_RESTARTS within SUPERVISOR_RESTART_WINDOW, or any
+    authentication failure, marks the session failed and removes its
+    container. Clients whose owner leaves the whitelist are stopped.
+    Containers run with restart policy "no" so the supervisor is the only
+    thing restarting them; clients found exited when the index is synced
+    or swept (e.g. after a daemon restart or host reboot, which sends no
+    die event) are restarted the same way. A stopped session is removed,
+    so it is never found exited.
+
+    Failures and restart history live in the state backend, so a reset on
+    any worker (e.g. the one serving /start-afk) is what the leader's
+    supervisor sees next.
+    """
+
+    def __init__(self, index: ContainerIndex, log_hub: LogHub, whitelist: WhitelistCache):
+        self.index = index
+        self.log_hub = log_hub
+        self.whitelist = whitelist
+        self.kick_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in settings.SUPERVISOR_KICK_PATTERNS]
+        self.auth_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in settings.SUPERVISOR_AUTH_PATTERNS]
+        self._scheduled = {}  # ign -> pending restart timer
+        self._restarting = set()  # igns with a restart call in progress
+        self._failing = set()  # igns being marked failed
+        # Shared failure records read for /status, {} when there is none
+        self.failures = TTLCache(
+            maxsize=settings.SUPERVISOR_FAILURE_CACHE_MAX_ENTRIES,
+            ttl=settings.SUPERVISOR_FAILURE_CACHE_TTL
+        )
+        metrics.register_cache("session_failures", self.failures)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stopping.set()  # Until start
+        self._executor = None
+        self._started_at = None
+
+    def failure(self, ign: str):
+        """Why the supervisor (in whichever worker leads) gave up on an IGN's session, or None.
+
+        Lookups are cached for SUPERVISOR_FAILURE_CACHE_TTL, so polling a
+        stopped session does not read the state backend every time.
+        """
+        failed = self.failures.get(ign)
+        if failed is None:
+            failed = get_state_backend().get(f"failure:{ign}") or {}
+            self.failures.set(ign, failed)
+        if not failed:
+            return None
+        return {"status": "failed", "logs": "\n".join(self.log_hub.recent(ign, 10)), "stats": None, **failed}
+
+    def reset(self, ign: str):
+        """Forget failures and restart history, e.g. when the user starts a new session"""
+        with self._lock:
+            timer = self._scheduled.pop(ign, None)
+        if timer is not None:
+            timer.cancel()
+        backend = get_state_backend()
+        with backend.lock(f"supervisor:{ign}"):
+            backend.set(f"failure:{ign}", None)
+            backend.set(f"restarts:{ign}", None)
+        self.failures.set(ign, {})
+
+    def _history(self, ign: str) -> list:
+        """Restart times (epoch seconds) of an IGN within SUPERVISOR_RESTART_WINDOW"""
+        cutoff = time.time() - settings.SUPERVISOR_RESTART_WINDOW
+        return [restarted for restarted in get_state_backend().get(f"restarts:{ign}") or [] if restarted >= cutoff]
+
+    def _on_container_event(self, action: str, entry: ClientContainer):
+        # Scheduling reads the state backend, so it runs on the executor rather than the events thread
+        if action == "sync" and entry.status == "exited" and entry.ign not in self._restarting:
+            self._executor.submit(self._schedule, entry, "found_exited")
+        elif action in ("die", "oom") and entry.ign not in self._restarting:
+            self._executor.submit(self._schedule, entry, "oom" if entry.oom_killed else "crash")
+        elif action == "destroy":
+            with self._lock:
+                timer = self._scheduled.pop(entry.ign, None)
+            if timer is not None:
+                timer.cancel()
+
+    def _on_log_line(self, ign: str, line: str, timestamp=None):
+        if CHAT_MESSAGE.search(line) or (timestamp is not None and timestamp < self._started_at):
+            return  # Chat, or a line the previous leader already acted on, replayed to the sinks
+        if any(pattern.search(line) for pattern in self.auth_patterns):
+            self._executor.submit(self._fail, ign, "auth_failed")
+        elif any(pattern.search(line) for pattern in self.kick_patterns):
+            entry = self.index.get(ign)
+            if entry is not None and entry.running:
+                self._executor.submit(self._schedule, entry, "kicked")
+
+    def _on_whitelist_change(self, ign: str, approved):
+        if not approved and self.index.get(ign) is not None:
+            logger.info(f"{ign} left the whitelist, stopping their client")
+            self._executor.submit(self._stop, ign, "unwhitelisted")
+
+    def _schedule(self, entry: ClientContainer, reason: str):
+        """Restart a client after its backoff, or fail the session once it is crash-looping"""
+        if entry.ign in self._scheduled or get_state_backend().get(f"failure:{entry.ign}") is not None:
+            return
+        history = self._history(entry.ign)
+        if len(history) >= settings.SUPERVISOR_MAX_RESTARTS:
+            self._fail(entry.ign, "crash_loop")
+            return
+        delay = min(
+            settings.SUPERVISOR_BACKOFF_BASE * 2 ** len(history),
+            settings.SUPERVISOR_BACKOFF_MAX
+        ) * random.uniform(0.5, 1.5)
+        timer = threading.Timer(delay, self._restart, args=(entry, reason))
+        timer.daemon = True
+        with self._lock:
+            if entry.ign in self._scheduled or self._stopping.is_set():
+                return
+            self._scheduled[entry.ign] = timer
+        logger.info(f"Restarting {entry.ign} ({reason}) in {delay:.1f}s")
+        timer.start()
+
+    def _restart(self, entry: ClientContainer, reason: str):
+        with self._lock:
+            self._scheduled.pop(entry.ign, None)
+        current = self.index.get(entry.ign)
+        if self._stopping.is_set() or current is None or current.id != entry.id:
+            return  # Stopped or replaced while we waited
+        self._restarting.add(entry.ign)
+        try:
+            if not get_scheduler().restart_client(entry):
+                return  # Stopped or replaced while we waited for the lock
+            backend = get_state_backend()
+            with backend.lock(f"supervisor:{entry.ign}"):
+                backend.set(f"restarts:{entry.ign}", self._history(entry.ign) + [time.time()])
+            metrics.SUPERVISOR_RESTARTS.labels(reason=reason).inc()
+        except (DockerException, RequestException, SQLAlchemyError, LifecycleBusy, LockTimeout) as e:
+            logger.warning(f"Failed to restart {entry.ign}: {e}")
+        finally:
+            self._restarting.discard(entry.ign)
+
+    def _fail(self, ign: str, reason: str):
+        with self._lock:
+            if ign in self._failing:
+                return
+            self._failing.add(ign)
+        try:
+            backend = get_state_backend()
+            if backend.get(f"failure:{ign}") is not None:
+                return
+            failed = {"reason": reason, "failed_at": time.time()}
+            backend.set(f"failure:{ign}", failed)
+            self.failures.set(ign, failed)
+            logger.warning(f"Giving up on {ign}'s session: {reason}")
+            metrics.SESSIONS_FAILED.labels(reason=reason).inc()
+            self._stop(ign, reason)
+        finally:
+            with self._lock:
+                self._failing.discard(ign)
+
+    def _stop(self, ign: str, reason: str):
+        with self._lock:
+            timer = self._scheduled.pop(ign, None)
+        if timer is not None:
+            timer.cancel()
+        self._restarting.add(ign)
+        try:
+            get_scheduler().stop_client(ign)
+            metrics.SUPERVISOR_STOPS.labels(reason=reason).inc()
+        finally:
+            self._restarting.discard(ign)
+
+    def check(self):
+        """Periodic pass: stop clients not on the whitelist, restart exited and silent ones"""
+        now = time.time()
+        for entry in self.index.exited():
+            if entry.ign not in self._restarting:
+                self._schedule(entry, "found_exited")
+        for entry in self.index.running():
+            if self.whitelist.loaded and not self.whitelist.is_approved(entry.ign):
+                self._executor.submit(self._stop, entry.ign, "unwhitelisted")
+                continue
+            if not settings.SUPERVISOR_SILENCE_TIMEOUT:
+                continue
+            last_seen = self.log_hub.last_seen(entry.id) or entry.started_at
+            if last_seen is not None and now - last_seen.timestamp() > settings.SUPERVISOR_SILENCE_TIMEOUT:
+                self._schedule(entry, "silent")
+
+    def start(self):
+        """Begin watching, if not already; may be called again after stop.
+
+        Call before the container index starts so no event is missed.
+        """
+        with self._lock:
+            if not self._stopping.is_set():
+                return
+            self._stopping = threading.Event()
+            self._started_at = datetime.now(timezone.utc)
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="supervisor")
+        self.index.add_listener(self._on_container_event)
+        self.log_hub.add_sink(self._on_log_line)
+        self.whitelist.add_listener(self._on_whitelist_change)
+        threading.Thread(target=self._watch, args=(self._stopping,), name="supervisor", daemon=True).start()
+
+    def stop(self):
+        """Stop watching and cancel pending restarts; events after this no longer reach the supervisor"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            self._stopping.set()
+            timers, self._scheduled = list(self._scheduled.values()), {}
+        self.index.remove_listener(self._on_container_event)
+        self.log_hub.remove_sink(self._on_log_line)
+        self.whitelist.remove_listener(self._on_whitelist_change)
+        for timer in timers:
+            timer.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _watch(self, stopping: threading.Event):
+        # First pass at once, so a new leader picks up clients that exited before it took over
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Supervisor check failed: {e}")
+            if stopping.wait(settings.SUPERVISOR_CHECK_INTERVAL):
+                return
+
+_supervisor = None
+
+def get_supervisor() -> Supervisor:
+    """FastAPI dependency returning the process-wide Supervisor"""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = Supervisor(get_container_index(), get_log_hub(), get_whitelist_cache())
+    return _supervisor
@@ -0,0 +1,125 @@
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+from core.config import settings
+from core import metrics
+from models.user import User
+from services.container_index import ClientContainer, get_container_index
+from services.docker_manager import default_host, get_docker_manager
+from services.state import LockTimeout, get_state_backend
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class WarmPool:
+    """Keeps WARM_POOL_SIZE client containers created, started and idle on a Docker host.
+
+    A warm container runs the client image behind a small wait script, so
+    claiming one skips image setup, container create and start: the claim
+    renames it to mc-client-<ign> and injects the session env file, which
+    lets the image's own entrypoint proceed. Docker is the source of truth
+    for which warm containers are idle, and claims take a cluster-wide lock
+    per host, so any worker can claim while only the leader refills. The
+    leader's refill thread creates at most one container per
+    WARM_POOL_REFILL_INTERVAL and wakes whenever a claim renames one.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self._idle = 0  # Running warm containers seen by the last sync
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._stopping.set()  # Until start
+
+    def __len__(self):
+        return self._idle
+
+    def claim(self, user: User):
+        """Bind an idle warm container to the user; None if the pool is empty, busy or the claim failed"""
+        docker_manager = get_docker_manager(self.host)
+        try:
+            with get_state_backend().lock(f"warm:{self.host}", settings.CLIENT_LOCK_TIMEOUT):
+                for candidate in docker_manager.list_warm_clients():
+                    if candidate.status != "running":
+                        continue  # Dropped by the leader's next sync
+                    try:
+                        container = docker_manager.bind_warm_client(candidate.id, user)
+                    except (DockerException, RequestException) as e:
+                        logger.warning(f"Failed to claim warm container for {user.ign}, starting cold: {e}")
+                        docker_manager.remove_container(candidate.id)
+                        return None
+                    if container is not None:
+                        return container
+                    # Crashed, OOM-killed or stopped by a daemon restart while idle
+                    logger.warning(f"Warm container {candidate.id[:12]} on {self.host} is not running, skipping it")
+        except LockTimeout:
+            logger.warning(f"Timed out waiting to claim a warm container on {self.host}, starting {user.ign} cold")
+        except (DockerException, RequestException) as e:
+            logger.warning(f"Failed to list warm containers on {self.host}, starting {user.ign} cold: {e}")
+        return None
+
+    def sync(self) -> int:
+        """Count running warm containers (including ones left by a previous leader) and drop dead ones"""
+        docker_manager = get_docker_manager(self.host)
+        running = 0
+        for container in docker_manager.list_warm_clients():
+            if container.status == "running":
+                running += 1
+            else:
+                docker_manager.remove_container(container.id)
+        with self._lock:
+            self._idle = running
+            metrics.WARM_POOL_IDLE.labels(host=self.host).set(running)
+        return running
+
+    def _refill(self, stopping: threading.Event):
+        self.sync()
+        while self._idle < settings.WARM_POOL_SIZE and not stopping.is_set():
+            get_docker_manager(self.host).create_warm_client()
+            with self._lock:
+                self._idle += 1
+                metrics.WARM_POOL_IDLE.labels(host=self.host).set(self._idle)
+            stopping.wait(settings.WARM_POOL_REFILL_INTERVAL)
+
+    def _on_container_event(self, action: str, entry: ClientContainer):
+        if action == "rename" and (entry.host or default_host()) == self.host:
+            self._wake.set()
+
+    def start(self):
+        """Start refilling, if not already; may be called again after stop"""
+        with self._lock:
+            if not self._stopping.is_set():
+                return
+            self._stopping = threading.Event()
+        get_container_index().add_listener(self._on_container_event)
+        threading.Thread(target=self._run, args=(self._stopping,), name=f"warm-pool-{self.host}", daemon=True).start()
+
+    def stop(self):
+        """Stop refilling; idle containers are kept for other workers and the next leader to claim"""
+        get_container_index().remove_listener(self._on_container_event)
+        self._stopping.set()
+        self._wake.set()
+
+    def _run(self, stopping: threading.Event):
+        backoff = 1
+        while not stopping.is_set():
+            try:
+                self._refill(stopping)
+                backoff = 1
+            except (DockerException, RequestException) as e:
+                logger.warning(f"Warm pool refill on {self.host} failed: {e}")
+                stopping.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            self._wake.wait(30)
+            self._wake.clear()
+
+_warm_pools = {}
+
+def get_warm_pool(host: str = None) -> WarmPool:
+    """Return the process-wide WarmPool of a host (the default host if None)"""
+    host = host or default_host()
+    if host not in _warm_pools:
+        _warm_pools[host] = WarmPool(host)
+    return _warm_pools[host]
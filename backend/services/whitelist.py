@@ -0,0 +1,202 @@
+from bisect import bisect_right
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
+from core.config import settings
+from core.dependencies import invalidate_principals
+from database import SessionLocal, get_engine
+from models.user import Whitelist
+import json
+import logging
+import psycopg2
+import select as io_select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WHITELIST_CHANNEL = "afk_whitelist"
+USERS_CHANNEL = "afk_users"
+
+# Installed by db_init. Any change to whitelist (including manage_permissions.sh)
+# and any change of a user's admin/active flags is broadcast to the backends.
+NOTIFY_TRIGGERS_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_whitelist_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('{WHITELIST_CHANNEL}', json_build_object('ign', OLD.ign, 'approved', NULL)::text);
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.ign IS DISTINCT FROM NEW.ign THEN
+        PERFORM pg_notify('{WHITELIST_CHANNEL}', json_build_object('ign', OLD.ign, 'approved', NULL)::text);
+    END IF;
+    PERFORM pg_notify('{WHITELIST_CHANNEL}', json_build_object('ign', NEW.ign, 'approved', NEW.approved)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS whitelist_notify ON whitelist;
+CREATE TRIGGER whitelist_notify AFTER INSERT OR UPDATE OR DELETE ON whitelist
+    FOR EACH ROW EXECUTE FUNCTION notify_whitelist_change();
+
+CREATE OR REPLACE FUNCTION notify_user_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{USERS_CHANNEL}', json_build_object('email', OLD.email, 'ign', OLD.ign)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_notify ON users;
+CREATE TRIGGER users_notify AFTER UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_change();
+"""
+
+def install_notify_triggers():
+    """Create the LISTEN/NOTIFY triggers the whitelist cache relies on"""
+    with get_engine().begin() as connection:
+        connection.execute(text(NOTIFY_TRIGGERS_SQL))
+
+class WhitelistCache:
+    """The whitelist held in memory: ign -> approved.
+
+    Loaded once, then kept in sync by a LISTEN connection on the whitelist
+    and users trigger channels, with a periodic full reload as a safety net.
+    The admin endpoints also write through, so checks are set lookups that
+    never need a database connection.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._sorted_igns = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._stopping = threading.Event()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    def is_approved(self, ign: str) -> bool:
+        return self._entries.get(ign, False)
+
+    def approved(self) -> list:
+        return [ign for ign, approved in list(self._entries.items()) if approved]
+
+    def page(self, after: str = None, limit: int = 1000) -> list:
+        """Entries ordered by IGN, starting after the given IGN"""
+        with self._lock:
+            if self._sorted_igns is None:
+                self._sorted_igns = sorted(self._entries)
+            igns = self._sorted_igns
+        start = bisect_right(igns, after) if after is not None else 0
+        return [
+            {"ign": ign, "approved": self._entries.get(ign, False)}
+            for ign in igns[start:start + limit]
+        ]
+
+    def add_listener(self, callback):
+        """Register callback(ign, approved) for every change; approved is None on removal"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def set(self, ign: str, approved: bool):
+        with self._lock:
+            previous = self._entries.get(ign)
+            self._entries[ign] = approved
+            if previous is None:
+                self._sorted_igns = None
+        if previous != approved:
+            self._notify(ign, approved)
+
+    def remove(self, ign: str):
+        with self._lock:
+            previous = self._entries.pop(ign, None)
+            self._sorted_igns = None
+        if previous is not None:
+            self._notify(ign, None)
+
+    def load(self):
+        """Replace the cache with the current contents of the whitelist table"""
+        db = SessionLocal()
+        try:
+            rows = db.execute(select(Whitelist.ign, Whitelist.approved)).all()
+        finally:
+            db.close()
+        entries = {ign: bool(approved) for ign, approved in rows}
+        with self._lock:
+            previous, self._entries = self._entries, entries
+            self._sorted_igns = None
+        initial = not self._loaded.is_set()
+        self._loaded.set()
+        if initial:
+            logger.info(f"Loaded {len(entries)} whitelist entries")
+            return
+        for ign in previous.keys() | entries.keys():
+            if previous.get(ign) != entries.get(ign):
+                self._notify(ign, entries.get(ign))
+
+    def _notify(self, ign: str, approved):
+        invalidate_principals(ign=ign)
+        for callback in list(self._listeners):
+            try:
+                callback(ign, approved)
+            except Exception as e:
+                logger.error(f"Whitelist listener failed for {ign}: {e}")
+
+    def _handle(self, channel: str, payload: str):
+        data = json.loads(payload)
+        if channel == USERS_CHANNEL:
+            invalidate_principals(email=data.get("email"), ign=data.get("ign"))
+        elif data.get("approved") is None:
+            self.remove(data["ign"])
+        else:
+            self.set(data["ign"], bool(data["approved"]))
+
+    def start(self):
+        threading.Thread(target=self._listen, name="whitelist-listen", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _listen(self):
+        backoff = 1
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(settings.DATABASE_URL)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {WHITELIST_CHANNEL}; LISTEN {USERS_CHANNEL};")
+                # Load after LISTEN so no change between the two is missed
+                self.load()
+                backoff = 1
+                next_resync = time.monotonic() + settings.WHITELIST_RESYNC_INTERVAL
+                while not self._stopping.is_set():
+                    if io_select.select([connection], [], [], 5)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            notify = connection.notifies.pop(0)
+                            self._handle(notify.channel, notify.payload)
+                    if time.monotonic() >= next_resync:
+                        self.load()
+                        next_resync = time.monotonic() + settings.WHITELIST_RESYNC_INTERVAL
+            except (psycopg2.Error, SQLAlchemyError, ValueError) as e:
+                logger.warning(f"Whitelist listener interrupted: {e}")
+            finally:
+                if connection is not None:
+                    connection.close()
+            if not self._stopping.is_set():
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+_whitelist_cache = None
+
+def get_whitelist_cache() -> WhitelistCache:
+    """FastAPI dependency returning the process-wide WhitelistCache"""
+    global _whitelist_cache
+    if _whitelist_cache is None:
+        _whitelist_cache = WhitelistCache()
+    return _whitelist_cache
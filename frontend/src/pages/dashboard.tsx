@@ -16,23 +16,60 @@ export default function Dashboard() {
       return;
     }
 
-    // Load initial status
-    checkAfkStatus();
+    // Item totals are read once; status, CPU and memory are pushed by the backend
     loadStats();
-  }, []);
-
-  const checkAfkStatus = async () => {
-    try {
-      const response = await axios.get('/api/minecraft/status', {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem('token')}`
+    // EventSource cannot send the bearer token, so each connection spends a
+    // single-use ticket; on any error reconnect with a fresh one
+    let events: EventSource | null = null;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+    const listen = (source: EventSource) => {
+      source.onerror = () => {
+        source.close();
+        if (!closed) retry = setTimeout(connect, 5000);
+      };
+      source.addEventListener('snapshot', (event) => {
+        const snapshot = JSON.parse((event as MessageEvent).data);
+        setAfkStatus(snapshot.status);
+        if (snapshot.stats) {
+          setStats((previous: any) => ({
+            ...previous,
+            ...formatUsage(snapshot.stats),
+            sessionTime: formatSessionTime(snapshot.stats.session_time)
+          }));
         }
       });
-      setAfkStatus(response.data.status);
-    } catch (error) {
-      console.error('Failed to check AFK status:', error);
-    }
-  };
+      source.addEventListener('status', (event) => {
+        setAfkStatus(JSON.parse((event as MessageEvent).data).status);
+      });
+      source.addEventListener('stats', (event) => {
+        const delta = JSON.parse((event as MessageEvent).data);
+        setStats((previous: any) => ({ ...previous, ...formatUsage(delta) }));
+      });
+    };
+    const connect = async () => {
+      try {
+        const response = await axios.post(
+          `${process.env.NEXT_PUBLIC_API_URL}/minecraft/events/ticket`, {},
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        if (closed) return;
+        events = new EventSource(
+          `${process.env.NEXT_PUBLIC_API_URL}/minecraft/events?ticket=${encodeURIComponent(response.data.ticket)}`
+        );
+        listen(events);
+      } catch (error) {
+        console.error('Failed to open the events stream:', error);
+        if (!closed) retry = setTimeout(connect, 5000);
+      }
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      events?.close();
+    };
+  }, []);
 
   const loadStats = async () => {
     try {
@@ -46,8 +83,7 @@ export default function Dashboard() {
         itemsCollected: data.items_collected,
         shinyItems: data.shiny_items,
         sessionTime: formatSessionTime(data.session_time),
-        cpuUsage: `${(data.cpu_usage / 1e9).toFixed(2)}%`,
-        memoryUsage: `${(data.memory_usage / (1024 * 1024)).toFixed(2)} MB`
+        ...formatUsage(data)
       });
     } catch (error) {
       console.error('Failed to load stats:', error);
@@ -61,6 +97,17 @@ export default function Dashboard() {
     }
   };
 
+  const formatUsage = (usage: { cpu_usage?: number; memory_usage?: number }) => {
+    const formatted: any = {};
+    if (usage.cpu_usage !== undefined) {
+      formatted.cpuUsage = `${usage.cpu_usage.toFixed(2)}%`;
+    }
+    if (usage.memory_usage !== undefined) {
+      formatted.memoryUsage = `${(usage.memory_usage / (1024 * 1024)).toFixed(2)} MB`;
+    }
+    return formatted;
+  };
+
   const formatSessionTime = (seconds: number) => {
     const hours = Math.floor(seconds / 3600);
     const minutes = Math.floor((seconds % 3600) / 60);
@@ -82,7 +129,6 @@ export default function Dashboard() {
           }
         });
       }
-      checkAfkStatus();
     } catch (error) {
       console.error('Failed to toggle AFK:', error);
     }